@@ -0,0 +1,178 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import statistics
+import time
+
+from mock_devin_api import MockDevinAPI, default_timeline
+from profiling import LoopLagMonitor
+from qa_results import QATestResult
+
+
+def percentiles(values: list[float]) -> dict[str, float]:
+    if not values:
+        return {}
+    values = sorted(values)
+    return {
+        "p50": round(values[len(values) // 2], 3),
+        "p95": round(values[min(len(values) - 1, int(len(values) * 0.95))], 3),
+        "max": round(values[-1], 3),
+        "mean": round(statistics.fmean(values), 3),
+    }
+
+
+async def run_benchmark(args: argparse.Namespace) -> dict:
+    api = MockDevinAPI(
+        latency=(0.0, args.latency),
+        error_rate=args.error_rate,
+        rate_limit=args.server_rate_limit,
+        burst=args.server_burst,
+        timeline_factory=lambda: default_timeline(
+            args.min_duration, args.max_duration, args.failure_rate
+        ),
+    )
+    base_url = await api.start()
+    # The runner builds its API client from the environment on import
+    os.environ.update(
+        {
+            "DEVIN_API_KEYS": "mock",
+            "DEVIN_API_BASE_URL": base_url,
+            "DEVIN_API_RATE_LIMIT": str(args.client_rate_limit),
+            "DEVIN_API_BURST": str(args.client_burst),
+            "DEVIN_API_MAX_CONNECTIONS": str(args.max_connections),
+            "SLACK_BOT_TOKEN": "",
+        }
+    )
+    import run_qa_devin
+    from session_poller import SessionPoller
+    from slack_reporter import SlackReporter
+
+    loop_monitor = LoopLagMonitor(args.stall_threshold, args.lag_interval)
+    loop_monitor.start()
+    test_names = [f"bench-{i}" for i in range(args.sessions)]
+    launched_at: list[float] = []
+    detection_latencies: list[float] = []
+
+    poller = SessionPoller(
+        run_qa_devin.devin_api_client,
+        poll_interval=args.poll_interval,
+        max_in_flight=args.max_concurrent_polls,
+        min_interval=args.min_poll_interval,
+        max_interval=args.max_poll_interval,
+    )
+    launcher = run_qa_devin.SessionLauncher(args.max_concurrent_launches)
+    reporter = SlackReporter(None, "benchmark", command="benchmark")
+
+    errors: list[str] = []
+
+    async def run_session(test_name: str) -> QATestResult:
+        try:
+            session_id, session_url = await launcher.launch(test_name, test_name)
+            launched_at.append(time.monotonic())
+            result = await run_qa_devin.poll_session_and_eval(
+                poller, test_name, session_id, session_url
+            )
+        except Exception as e:
+            errors.append(repr(e))
+            return QATestResult(
+                test_name=test_name,
+                session_id="",
+                session_url="",
+                status_enum="error",
+                success=False,
+                message=f"Test failed with exception: {str(e)}",
+                duration=0.0,
+            )
+        if result["status_enum"] != "error":
+            detection_latencies.append(
+                time.monotonic() - api.sessions[session_id].finished_at
+            )
+        return result
+
+    start = time.monotonic()
+    async with run_qa_devin.devin_api_client:
+        poller.start()
+        await reporter.start(test_names)
+        tasks = [asyncio.create_task(run_session(name)) for name in test_names]
+        for task in asyncio.as_completed(tasks):
+            await reporter.report(await task)
+        await poller.stop()
+        await reporter.finish()
+    elapsed = time.monotonic() - start
+    await loop_monitor.stop()
+    await api.stop()
+
+    return {
+        "sessions": args.sessions,
+        "elapsed": round(elapsed, 3),
+        "launch_throughput": round(
+            len(launched_at) / max(1e-9, max(launched_at, default=start) - start), 1
+        ),
+        "errors": len(errors),
+        "requests": api.total_requests,
+        "requests_per_session": round(api.total_requests / args.sessions, 2),
+        "request_counts": api.request_counts,
+        "loop_lag": loop_monitor.report(),
+        "detection_latency": percentiles(detection_latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Drive the QA runner's launch, poll and report path with "
+        "synthetic sessions against the local mock Devin API."
+    )
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument(
+        "--min-duration", type=float, default=5, help="Shortest session (seconds)"
+    )
+    parser.add_argument(
+        "--max-duration", type=float, default=30, help="Longest session (seconds)"
+    )
+    parser.add_argument("--failure-rate", type=float, default=0.1)
+    parser.add_argument(
+        "--latency", type=float, default=0.05, help="Max API latency (seconds)"
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="Share of 503 responses"
+    )
+    parser.add_argument(
+        "--server-rate-limit", type=float, help="API requests/sec before 429s"
+    )
+    parser.add_argument("--server-burst", type=int, default=20)
+    parser.add_argument("--client-rate-limit", type=float, default=1000)
+    parser.add_argument("--client-burst", type=int, default=100)
+    parser.add_argument("--max-connections", type=int, default=100)
+    parser.add_argument("--max-concurrent-launches", type=int, default=50)
+    parser.add_argument("--max-concurrent-polls", type=int, default=100)
+    parser.add_argument("--poll-interval", type=float, default=5)
+    parser.add_argument("--min-poll-interval", type=float, default=1)
+    parser.add_argument("--max-poll-interval", type=float, default=10)
+    parser.add_argument(
+        "--lag-interval",
+        type=float,
+        default=0.05,
+        help="How often to sample event loop lag (seconds)",
+    )
+    parser.add_argument(
+        "--stall-threshold",
+        type=float,
+        default=0.1,
+        help="Flag event loop stalls longer than this (seconds)",
+    )
+    parser.add_argument("--output", help="Also write the report to this JSON file")
+    args = parser.parse_args()
+
+    # The runner's own progress output would drown the report
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        report = asyncio.run(run_benchmark(args))
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,11 @@
+import asyncio
 import os
-from typing import Literal, Optional, TypedDict
+import random
+import time
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable, Literal, Optional, TypedDict
 
 import aiohttp
 from dotenv import load_dotenv
@@ -13,6 +19,20 @@ class DevinAPIAuthResponse(TypedDict):
     org_id: str
 
 
+class DevinAPISessionOptions(TypedDict, total=False):
+    """Optional session creation parameters sent along with the prompt."""
+
+    snapshot_id: str
+    playbook_id: str
+    title: str
+    tags: list[str]
+    unlisted: bool
+    idempotent: bool
+    max_acu_limit: int
+    secret_ids: list[str]
+    knowledge_ids: list[str]
+
+
 class DevinAPISessionResponse(TypedDict):
     session_id: str
     url: str
@@ -41,60 +61,531 @@ class DevinAPISessionStatusResponse(TypedDict):
     )
 
 
+DEFAULT_BASE_URL = "https://api.devin.ai/v1"
+
+# Responses that are safe to retry for any request, and additionally for
+# idempotent ones (where a retried request cannot create a second session)
+RETRY_STATUSES = {429, 503}
+IDEMPOTENT_RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Per-operation timeouts, so one hung connection cannot stall a caller
+DEFAULT_TIMEOUTS = {
+    "check_auth": aiohttp.ClientTimeout(total=30, connect=10, sock_read=20),
+    "start_session": aiohttp.ClientTimeout(total=120, connect=10, sock_read=90),
+    "get_session_status": aiohttp.ClientTimeout(total=20, connect=5, sock_read=15),
+    "send_message": aiohttp.ClientTimeout(total=60, connect=10, sock_read=45),
+    "stop_session": aiohttp.ClientTimeout(total=30, connect=10, sock_read=20),
+}
+
+# Latency samples needed before hedging kicks in
+MIN_HEDGE_SAMPLES = 20
+
+
+class RequestEvent(TypedDict):
+    """One attempt of a Devin API request, as passed to request hooks."""
+
+    operation: str
+    method: str
+    path: str
+    # None if the attempt failed without a response (timeout, connection error)
+    status: int | None
+    latency: float
+    attempt: int
+    will_retry: bool
+
+
+RequestHook = Callable[[RequestEvent], None]
+
+
+class TokenBucket:
+    """Client-side rate limiter shared by every request of a client.
+
+    Allows `rate` requests/sec on average with bursts of up to `burst`.
+    `pause` blocks all requests for a while, e.g. after the API asked us to
+    back off with a 429.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                wait = self.try_acquire()
+                if not wait:
+                    return
+                await asyncio.sleep(wait)
+
+    def try_acquire(self) -> float:
+        """Take a token if one is available, else return seconds until one is."""
+        now = time.monotonic()
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._updated_at) * self.rate
+        )
+        self._updated_at = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Parse a Retry-After header given either in seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
 class DevinAPIClient:
-    def __init__(self, api_key: str):
+    def __init__(
+        self,
+        api_key: str,
+        limit_per_host: int = 20,
+        keepalive_timeout: float = 60,
+        dns_cache_ttl: int = 300,
+        rate_limit: float | None = 10,
+        burst: int = 20,
+        max_retries: int = 5,
+        backoff_base: float = 1,
+        backoff_max: float = 60,
+        timeouts: dict[str, aiohttp.ClientTimeout] | None = None,
+        hedge_percentile: float | None = None,
+        base_url: str = DEFAULT_BASE_URL,
+        request_hooks: list[RequestHook] | None = None,
+    ):
         self.api_key = api_key
         self.headers = {
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json",
         }
-        self.base_url = "https://api.devin.ai/v1"
+        self.base_url = base_url
+        self.request_hooks = list(request_hooks or [])
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.rate_limiter = TokenBucket(rate_limit, burst) if rate_limit else None
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+        self.hedge_percentile = hedge_percentile
+        self._status_latencies: deque[float] = deque(maxlen=200)
+        self._session: aiohttp.ClientSession | None = None
+
+    async def __aenter__(self) -> "DevinAPIClient":
+        self._get_session()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # The session is created lazily so that it binds to the running event loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.dns_cache_ttl,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector, headers=self.headers
+            )
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def add_request_hook(self, hook: RequestHook) -> None:
+        """Call `hook` after every request attempt, e.g. to collect metrics."""
+        self.request_hooks.append(hook)
+
+    def _notify_request_hooks(
+        self,
+        operation: str,
+        method: str,
+        path: str,
+        status: int | None,
+        started: float,
+        attempt: int,
+        will_retry: bool,
+    ) -> None:
+        event: RequestEvent = {
+            "operation": operation,
+            "method": method,
+            "path": path,
+            "status": status,
+            "latency": time.monotonic() - started,
+            "attempt": attempt,
+            "will_retry": will_retry,
+        }
+        for hook in self.request_hooks:
+            hook(event)
+
+    def _retry_delay(self, attempt: int, retry_after: float | None) -> float:
+        # Full jitter exponential backoff, but never earlier than the server asked
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    async def _request(
+        self,
+        operation: str,
+        method: str,
+        path: str,
+        idempotent: bool = True,
+        **kwargs,
+    ) -> dict:
+        """Send a request, retrying throttled and failed responses.
+
+        Timeouts and connection errors are retried for idempotent requests
+        only. Raises aiohttp.ClientResponseError once retries are exhausted or
+        for any other non-2xx response.
+        """
+        retry_statuses = IDEMPOTENT_RETRY_STATUSES if idempotent else RETRY_STATUSES
+        attempt = 0
+        while True:
+            if self.rate_limiter:
+                await self.rate_limiter.acquire()
+            started = time.monotonic()
+            try:
+                async with self._get_session().request(
+                    method,
+                    f"{self.base_url}{path}",
+                    timeout=self.timeouts[operation],
+                    **kwargs,
+                ) as response:
+                    will_retry = (
+                        response.status in retry_statuses and attempt < self.max_retries
+                    )
+                    self._notify_request_hooks(
+                        operation,
+                        method,
+                        path,
+                        response.status,
+                        started,
+                        attempt,
+                        will_retry,
+                    )
+                    if will_retry:
+                        retry_after = parse_retry_after(
+                            response.headers.get("Retry-After")
+                        )
+                        delay = self._retry_delay(attempt, retry_after)
+                        if response.status == 429 and self.rate_limiter:
+                            self.rate_limiter.pause(delay)
+                        print(
+                            f"Devin API {method} {path} returned {response.status}, "
+                            f"retrying in {delay:.1f}s"
+                        )
+                    else:
+                        response.raise_for_status()
+                        if response.content_type != "application/json":
+                            return {}
+                        return await response.json()
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                will_retry = idempotent and attempt < self.max_retries
+                self._notify_request_hooks(
+                    operation, method, path, None, started, attempt, will_retry
+                )
+                if not will_retry:
+                    raise
+                delay = self._retry_delay(attempt, None)
+                print(
+                    f"Devin API {method} {path} failed with {e!r}, "
+                    f"retrying in {delay:.1f}s"
+                )
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def _hedge_delay(self) -> float | None:
+        if (
+            self.hedge_percentile is None
+            or len(self._status_latencies) < MIN_HEDGE_SAMPLES
+        ):
+            return None
+        latencies = sorted(self._status_latencies)
+        index = int(len(latencies) * self.hedge_percentile / 100)
+        return latencies[min(index, len(latencies) - 1)]
+
+    async def _timed_status_request(self, session_id: str) -> dict:
+        start = time.monotonic()
+        response_data = await self._request(
+            "get_session_status", "GET", f"/session/{session_id}"
+        )
+        self._status_latencies.append(time.monotonic() - start)
+        return response_data
+
+    async def _hedged_status_request(self, session_id: str) -> dict:
+        """Fetch a session status, hedging slow requests.
+
+        If the first request is slower than the configured latency percentile
+        a second identical request is sent and whichever succeeds first wins.
+        """
+        hedge_delay = self._hedge_delay()
+        if hedge_delay is None:
+            return await self._timed_status_request(session_id)
+
+        first = asyncio.ensure_future(self._timed_status_request(session_id))
+        tasks = [first]
+        try:
+            done, _ = await asyncio.wait({first}, timeout=hedge_delay)
+            if done:
+                return first.result()
+
+            tasks.append(asyncio.ensure_future(self._timed_status_request(session_id)))
+            pending = set(tasks)
+            error: BaseException | None = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            assert error is not None
+            raise error
+        finally:
+            # Also when the caller is cancelled, so no request outlives it
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
 
     async def check_auth(self) -> DevinAPIAuthResponse:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                f"{self.base_url}/auth_status",
-                headers=self.headers,
-            ) as response:
-                return await response.json()
-
-    async def start_session(self, prompt: str) -> DevinAPISessionResponse:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{self.base_url}/sessions",
-                headers=self.headers,
-                json={"prompt": prompt},
-            ) as response:
-                response_data = await response.json()
-                return response_data
+        return await self._request("check_auth", "GET", "/auth_status")
+
+    async def start_session(
+        self,
+        prompt: str,
+        snapshot_id: str | None = None,
+        playbook_id: str | None = None,
+        options: DevinAPISessionOptions | None = None,
+    ) -> DevinAPISessionResponse:
+        """Start a session, optionally booting from a snapshot and/or playbook."""
+        payload = {"prompt": prompt, **(options or {})}
+        if snapshot_id:
+            payload["snapshot_id"] = snapshot_id
+        if playbook_id:
+            payload["playbook_id"] = playbook_id
+        return await self._request(
+            "start_session",
+            "POST",
+            "/sessions",
+            idempotent=False,
+            json=payload,
+        )
 
     async def get_session_status(
         self, session_id: str
     ) -> DevinAPISessionStatusResponse | None:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                f"{self.base_url}/session/{session_id}",
-                headers=self.headers,
-            ) as response:
-                response_data = await response.json()
-                if (
-                    "detail" in response_data
-                    and response_data["detail"] == "Session not found"
-                ):
-                    return None
-                return response_data
+        try:
+            return await self._hedged_status_request(session_id)
+        except aiohttp.ClientResponseError as e:
+            if e.status == 404:
+                return None
+            raise
+
+    async def send_message(self, session_id: str, message: str) -> None:
+        await self._request(
+            "send_message",
+            "POST",
+            f"/session/{session_id}/message",
+            idempotent=False,
+            json={"message": message},
+        )
+
+    async def stop_session(self, session_id: str) -> None:
+        await self._request("stop_session", "DELETE", f"/sessions/{session_id}")
+
+
+class DevinAPIClientPool:
+    """Spreads sessions over several API keys, each with its own client.
+
+    Every key has an optional capacity (max concurrent sessions). New
+    sessions go to the key with the most free capacity, waiting if all keys
+    are full. Each session stays pinned to the key that created it, and every
+    key keeps its own connection pool and request budget. Call
+    `session_finished` once a session no longer needs its key's capacity,
+    and `reattach` for sessions started by an earlier process before
+    starting new ones.
+    """
+
+    def __init__(self, clients: list[DevinAPIClient], capacities: list[int | None]):
+        assert clients and len(clients) == len(capacities)
+        self.clients = clients
+        self.capacities = capacities
+        self._active = [0] * len(clients)
+        # Key of every session seen, kept after it finishes
+        self._session_clients: dict[str, int] = {}
+        # Sessions counted in `_active`
+        self._active_sessions: set[str] = set()
+        self._capacity_freed = asyncio.Condition()
+
+    @property
+    def total_capacity(self) -> int | None:
+        if any(capacity is None for capacity in self.capacities):
+            return None
+        return sum(self.capacities)
+
+    async def __aenter__(self) -> "DevinAPIClientPool":
+        for client in self.clients:
+            await client.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        for client in self.clients:
+            await client.close()
+
+    def _free_capacity(self, index: int) -> float:
+        capacity = self.capacities[index]
+        if capacity is None:
+            return float("inf")
+        return capacity - self._active[index]
+
+    async def _find_key(self, session_id: str) -> int | None:
+        if session_id not in self._session_clients:
+            # A session from an earlier process (e.g. --resume); find its key
+            for index, client in enumerate(self.clients):
+                if await client.get_session_status(session_id) is not None:
+                    self._session_clients[session_id] = index
+                    break
+        return self._session_clients.get(session_id)
+
+    async def _client_for(self, session_id: str) -> DevinAPIClient:
+        index = await self._find_key(session_id)
+        return self.clients[index if index is not None else 0]
+
+    async def reattach(self, session_ids: list[str]) -> None:
+        """Count still running sessions of an earlier process against their keys.
+
+        Call before starting new sessions, so that those are not put on a
+        key the reattached sessions already fill.
+        """
+        session_ids = [
+            session_id
+            for session_id in set(session_ids)
+            if session_id not in self._active_sessions
+        ]
+        keys = await asyncio.gather(
+            *(self._find_key(session_id) for session_id in session_ids)
+        )
+        for session_id, index in zip(session_ids, keys):
+            if index is not None:
+                self._active[index] += 1
+                self._active_sessions.add(session_id)
+
+    def add_request_hook(self, hook: RequestHook) -> None:
+        for client in self.clients:
+            client.add_request_hook(hook)
+
+    async def check_auth(self) -> list[DevinAPIAuthResponse]:
+        return list(
+            await asyncio.gather(*(client.check_auth() for client in self.clients))
+        )
+
+    async def start_session(
+        self,
+        prompt: str,
+        snapshot_id: str | None = None,
+        playbook_id: str | None = None,
+        options: DevinAPISessionOptions | None = None,
+    ) -> DevinAPISessionResponse:
+        async with self._capacity_freed:
+            await self._capacity_freed.wait_for(
+                lambda: any(
+                    self._free_capacity(index) > 0 for index in range(len(self.clients))
+                )
+            )
+            index = max(
+                range(len(self.clients)),
+                key=lambda i: (self._free_capacity(i), -self._active[i]),
+            )
+            self._active[index] += 1
+        try:
+            response = await self.clients[index].start_session(
+                prompt, snapshot_id, playbook_id, options
+            )
+        except BaseException:
+            await self._release(index)
+            raise
+        self._session_clients[response["session_id"]] = index
+        self._active_sessions.add(response["session_id"])
+        return response
+
+    async def session_finished(self, session_id: str) -> None:
+        # The key stays known, e.g. for stopping the session later
+        if session_id in self._active_sessions:
+            self._active_sessions.remove(session_id)
+            await self._release(self._session_clients[session_id])
+
+    async def _release(self, index: int) -> None:
+        async with self._capacity_freed:
+            self._active[index] -= 1
+            self._capacity_freed.notify_all()
+
+    async def get_session_status(
+        self, session_id: str
+    ) -> DevinAPISessionStatusResponse | None:
+        client = await self._client_for(session_id)
+        return await client.get_session_status(session_id)
+
+    async def send_message(self, session_id: str, message: str) -> None:
+        client = await self._client_for(session_id)
+        await client.send_message(session_id, message)
+
+    async def stop_session(self, session_id: str) -> None:
+        client = await self._client_for(session_id)
+        await client.stop_session(session_id)
+
+
+def parse_api_keys(value: str) -> list[tuple[str, int | None]]:
+    """Parse "key1:10,key2" into [(key1, 10), (key2, None)]."""
+    keys = []
+    for entry in value.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        key, _, capacity = entry.partition(":")
+        keys.append((key, int(capacity) if capacity else None))
+    return keys
 
 
 async def main():
     api_key = os.getenv("DEVIN_API_KEY")
     if not api_key:
         raise ValueError("DEVIN_API_KEY environment variable is required")
-    client = DevinAPIClient(api_key)
-    auth_status = await client.check_auth()
+    async with DevinAPIClient(api_key) as client:
+        auth_status = await client.check_auth()
     print("AUTH STATUS: ", auth_status)
 
 
 if __name__ == "__main__":
-    import asyncio
-
     asyncio.run(main())
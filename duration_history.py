@@ -0,0 +1,81 @@
+import json
+import os
+import statistics
+from typing import TypedDict
+
+# Number of most recent runs kept per test
+MAX_RUNS_PER_TEST = 20
+
+
+class TestTiming(TypedDict):
+    # Wall-clock timestamps: ready to run, session started (or prompt sent)
+    # and result received
+    queued_at: float
+    started_at: float
+    finished_at: float
+    # Time from session start to result
+    duration: float
+    status_enum: str
+    success: bool
+    timed_out: bool
+
+
+def load_history(path: str) -> dict[str, list[TestTiming]]:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        history = json.load(f)
+    # Older files stored bare durations of finished runs
+    return {
+        test_name: [
+            (
+                {"duration": run, "status_enum": "unknown", "timed_out": False}
+                if isinstance(run, (int, float))
+                else run
+            )
+            for run in runs
+        ]
+        for test_name, runs in history.items()
+    }
+
+
+def median_durations(path: str) -> dict[str, float]:
+    """Median duration per test over runs that finished in time."""
+    medians = {}
+    for test_name, runs in load_history(path).items():
+        durations = [
+            run["duration"]
+            for run in runs
+            if not run["timed_out"] and run["status_enum"] != "error"
+        ]
+        if durations:
+            medians[test_name] = statistics.median(durations)
+    return medians
+
+
+def record_timings(path: str, timings: dict[str, TestTiming]) -> None:
+    history = load_history(path)
+    for test_name, timing in timings.items():
+        history[test_name] = (history.get(test_name, []) + [timing])[
+            -MAX_RUNS_PER_TEST:
+        ]
+    with open(path, "w") as f:
+        json.dump(history, f, indent=2)
+
+
+def merge_histories(paths: list[str], path: str) -> None:
+    """Merge timing databases that grew from one common file into `path`.
+
+    Each shard of a run starts from the same history and appends its own
+    tests' runs; the union keeps every run once, in finishing order.
+    """
+    merged: dict[str, list[TestTiming]] = {}
+    for source in paths:
+        for test_name, runs in load_history(source).items():
+            known = merged.setdefault(test_name, [])
+            known.extend(run for run in runs if run not in known)
+    for test_name, runs in merged.items():
+        runs.sort(key=lambda run: run.get("finished_at", 0.0))
+        merged[test_name] = runs[-MAX_RUNS_PER_TEST:]
+    with open(path, "w") as f:
+        json.dump(merged, f, indent=2)
@@ -0,0 +1,212 @@
+import json
+import os
+import time
+from typing import TypedDict
+
+from devin_api_client import DevinAPISessionStatusResponse
+from qa_results import QATestResult
+
+
+class LifecycleEvent(TypedDict, total=False):
+    event: str
+    at: float
+    status_enum: str | None
+    success: bool
+    latency: float
+
+
+class TestLifecycle(TypedDict):
+    test_name: str
+    session_id: str
+    events: list[LifecycleEvent]
+    polls: int
+    poll_latencies: list[float]
+
+
+def _first_event_at(lifecycle: TestLifecycle, event: str) -> float | None:
+    for recorded in lifecycle["events"]:
+        if recorded["event"] == event:
+            return recorded["at"]
+    return None
+
+
+def _elapsed(lifecycle: TestLifecycle, start: str, end: str) -> float | None:
+    started_at = _first_event_at(lifecycle, start)
+    ended_at = _first_event_at(lifecycle, end)
+    if started_at is None or ended_at is None:
+        return None
+    return round(ended_at - started_at, 3)
+
+
+def summarize(lifecycle: TestLifecycle) -> dict:
+    """Where a test's time went, in seconds, derived from its events."""
+    latencies = sorted(lifecycle["poll_latencies"])
+    launch = next(
+        (
+            event
+            for event in lifecycle["events"]
+            if event["event"] in ("launched", "sent")
+        ),
+        None,
+    )
+    return {
+        "queue_seconds": _elapsed(lifecycle, "queued", "admitted"),
+        "launch_seconds": launch.get("latency") if launch else None,
+        "time_to_working_seconds": _elapsed(lifecycle, "admitted", "first_working"),
+        "time_to_output_seconds": _elapsed(
+            lifecycle, "admitted", "structured_output_seen"
+        ),
+        "duration_seconds": _elapsed(lifecycle, "admitted", "finished"),
+        "polls": lifecycle["polls"],
+        "poll_latency_p50_seconds": (
+            round(latencies[len(latencies) // 2], 3) if latencies else None
+        ),
+        "poll_latency_max_seconds": round(latencies[-1], 3) if latencies else None,
+    }
+
+
+class RunMetrics:
+    """Per-test lifecycle events of one run, exported when the run ends.
+
+    Every test (and fixture) gets a timeline: queued, admitted to a session
+    slot, launched (or sent to a batched session), each status transition,
+    first working, structured output seen and finished, plus its poll count
+    and status request latencies. Polls are attributed to the test currently
+    running in the polled session.
+    """
+
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self.started_at = time.time()
+        self.tests: dict[str, TestLifecycle] = {}
+        self._session_tests: dict[str, str] = {}
+
+    def _lifecycle(self, test_name: str) -> TestLifecycle:
+        if test_name not in self.tests:
+            self.tests[test_name] = {
+                "test_name": test_name,
+                "session_id": "",
+                "events": [],
+                "polls": 0,
+                "poll_latencies": [],
+            }
+        return self.tests[test_name]
+
+    def record_event(self, test_name: str, event: str, **data) -> None:
+        self._lifecycle(test_name)["events"].append(
+            {"event": event, "at": time.time(), **data}
+        )
+
+    def record_launched(
+        self,
+        test_name: str,
+        session_id: str,
+        latency: float | None = None,
+        event: str = "launched",
+    ) -> None:
+        self._lifecycle(test_name)["session_id"] = session_id
+        self._session_tests[session_id] = test_name
+        if latency is None:
+            self.record_event(test_name, event)
+        else:
+            self.record_event(test_name, event, latency=round(latency, 3))
+
+    def record_poll(
+        self,
+        session_id: str,
+        status: DevinAPISessionStatusResponse | None,
+        previous_status: DevinAPISessionStatusResponse | None,
+        latency: float,
+    ) -> None:
+        test_name = self._session_tests.get(session_id)
+        if test_name is None:
+            return
+        lifecycle = self._lifecycle(test_name)
+        first_poll = lifecycle["polls"] == 0
+        lifecycle["polls"] += 1
+        lifecycle["poll_latencies"].append(latency)
+
+        status_enum = status["status_enum"] if status else None
+        if first_poll or status_enum != (
+            previous_status["status_enum"] if previous_status else None
+        ):
+            self.record_event(test_name, "status", status_enum=status_enum)
+        if (
+            status_enum == "working"
+            and _first_event_at(lifecycle, "first_working") is None
+        ):
+            self.record_event(test_name, "first_working")
+        output = status["structured_output"] if status else None
+        if output and _first_event_at(lifecycle, "structured_output_seen") is None:
+            self.record_event(test_name, "structured_output_seen")
+
+    def record_finished(self, test_name: str, result: QATestResult) -> None:
+        self.record_event(
+            test_name,
+            "finished",
+            status_enum=result["status_enum"],
+            success=result["success"],
+        )
+
+    def write_json(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(
+                {
+                    "run_id": self.run_id,
+                    "started_at": self.started_at,
+                    "finished_at": time.time(),
+                    "tests": [
+                        {
+                            "test_name": lifecycle["test_name"],
+                            "session_id": lifecycle["session_id"],
+                            **summarize(lifecycle),
+                            "events": lifecycle["events"],
+                        }
+                        for lifecycle in self.tests.values()
+                    ],
+                },
+                f,
+                indent=2,
+            )
+
+    def write_prometheus(self, path: str) -> None:
+        """Write the run in the node_exporter textfile collector format."""
+        metrics = {
+            "queue_seconds": "Time the test waited for a session slot",
+            "launch_seconds": "Latency of starting the test's session",
+            "time_to_working_seconds": "Time until the session first worked",
+            "time_to_output_seconds": "Time until a structured output appeared",
+            "duration_seconds": "Time from admission until the test finished",
+            "polls": "Session status polls spent on the test",
+            "poll_latency_p50_seconds": "Median session status request latency",
+        }
+        summaries = {
+            test_name: summarize(lifecycle)
+            for test_name, lifecycle in self.tests.items()
+        }
+        lines = [
+            "# HELP qa_run_duration_seconds Wall-clock duration of the QA run",
+            "# TYPE qa_run_duration_seconds gauge",
+            f"qa_run_duration_seconds {time.time() - self.started_at:.3f}",
+        ]
+        for name, help_text in metrics.items():
+            lines.append(f"# HELP qa_test_{name} {help_text}")
+            lines.append(f"# TYPE qa_test_{name} gauge")
+            for test_name, summary in summaries.items():
+                if summary[name] is not None:
+                    lines.append(
+                        f'qa_test_{name}{{test="{test_name}"}} {summary[name]}'
+                    )
+        lines.append("# HELP qa_test_success Whether the test passed")
+        lines.append("# TYPE qa_test_success gauge")
+        for test_name, lifecycle in self.tests.items():
+            finished = [e for e in lifecycle["events"] if e["event"] == "finished"]
+            if finished:
+                success = int(bool(finished[-1].get("success")))
+                lines.append(f'qa_test_success{{test="{test_name}"}} {success}')
+
+        # Write atomically so the collector never reads a half-written file
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
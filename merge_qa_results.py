@@ -0,0 +1,156 @@
+import argparse
+import asyncio
+import os
+import sys
+
+from dotenv import load_dotenv
+from slack_sdk.web.async_client import AsyncWebClient
+from tests import QA_TESTS, select_qa_tests
+
+from duration_history import merge_histories
+from qa_results import QATestResult, load_results
+from slack_reporter import SlackReporter
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Default Slack channel for test results
+SLACK_TEST_RESULTS_CHANNEL_ID = os.getenv("SLACK_CHANNEL_ID", "test-results")
+SLACK_BOT_TOKEN = os.getenv("SLACK_BOT_TOKEN", "")
+
+
+async def merge_and_send_to_slack(
+    paths: list[str],
+    shard_count: int | None = None,
+    test_names: list[str] | None = None,
+    tags: list[str] | None = None,
+    exclude_tags: list[str] | None = None,
+) -> list[str]:
+    """Combine the result files of all shards into one Slack report.
+
+    Shards that wrote no results file (they crashed or failed pre-flight)
+    are detected from the other shards' `shard` metadata, or `shard_count`.
+    The tests they would have run, i.e. those selected by the run's test
+    names, tags and exclude tags (from the shards' metadata, else the
+    arguments) without a result, are reported as failed. Returns the missing
+    shards.
+    """
+    results: list[QATestResult] = []
+    commands: list[str] = []
+    interrupted = False
+    present_shards: set[int] = set()
+    for path in sorted(paths):
+        if not os.path.exists(path):
+            print(f"Warning: results file {path} does not exist")
+            continue
+        shard_results = load_results(path)
+        results.extend(shard_results["results"])
+        interrupted = interrupted or shard_results.get("interrupted", False)
+        if shard_results.get("command"):
+            commands.append(shard_results["command"])
+        if shard_results.get("shard"):
+            index, count = (int(part) for part in shard_results["shard"].split("/"))
+            present_shards.add(index)
+            shard_count = shard_count or count
+        if "test_names" in shard_results:
+            test_names = shard_results["test_names"]
+            tags = shard_results["tags"]
+            exclude_tags = shard_results["exclude_tags"]
+
+    missing_shards = [
+        f"{index}/{shard_count}"
+        for index in range(1, (shard_count or 0) + 1)
+        if index not in present_shards
+    ]
+    reported = {result["test_name"] for result in results}
+    unreported = [
+        test["test_name"]
+        for test in select_qa_tests(test_names, tags, exclude_tags)
+        if test["test_name"] not in reported
+    ]
+    unfinished: list[str] = []
+    if missing_shards:
+        print(f"Warning: shards {', '.join(missing_shards)} wrote no results")
+        # Their tests never reported; fail them rather than leave them out
+        results.extend(
+            QATestResult(
+                test_name=test_name,
+                session_id="",
+                session_url="",
+                status_enum="error",
+                success=False,
+                message=f"No result: shards {', '.join(missing_shards)} "
+                "wrote no results file",
+                duration=0.0,
+            )
+            for test_name in unreported
+        )
+    else:
+        # Tests an interrupted shard never finished
+        unfinished = unreported
+
+    # Report in catalog order, as an unsharded run would
+    test_order = {test["test_name"]: i for i, test in enumerate(QA_TESTS)}
+    results.sort(
+        key=lambda result: test_order.get(result["test_name"], len(test_order))
+    )
+
+    reporter = SlackReporter(
+        AsyncWebClient(token=SLACK_BOT_TOKEN) if SLACK_BOT_TOKEN else None,
+        SLACK_TEST_RESULTS_CHANNEL_ID,
+        command=commands[0] if commands else "merge_qa_results.py",
+    )
+    await reporter.start(
+        sorted(
+            [result["test_name"] for result in results] + unfinished,
+            key=lambda test_name: test_order.get(test_name, len(test_order)),
+        )
+    )
+    for result in results:
+        await reporter.report(result)
+    await reporter.finish(interrupted=interrupted or bool(unfinished))
+    return missing_shards
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "results_files", nargs="*", help="Result files written by each shard"
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        help="Number of shards the run was split into, to detect shards that "
+        "wrote no results file even if none did",
+    )
+    # The run's test selection, to report the tests of missing shards
+    parser.add_argument("--tests", help="Comma-separated test names or globs")
+    parser.add_argument("--tags", help="Comma-separated tags")
+    parser.add_argument("--exclude-tags", help="Comma-separated tags")
+    parser.add_argument(
+        "--durations",
+        nargs="*",
+        default=[],
+        help="Timing databases written by each shard, merged into " "--durations-file",
+    )
+    parser.add_argument("--durations-file", default="qa_test_durations.json")
+    args = parser.parse_args()
+    durations = [path for path in args.durations if os.path.exists(path)]
+    if durations:
+        merge_histories(durations, args.durations_file)
+        print(
+            f"Merged test timings of {len(durations)} shards into {args.durations_file}"
+        )
+    missing_shards = await merge_and_send_to_slack(
+        args.results_files,
+        shard_count=args.shards,
+        test_names=args.tests.split(",") if args.tests else None,
+        tags=args.tags.split(",") if args.tags else None,
+        exclude_tags=args.exclude_tags.split(",") if args.exclude_tags else None,
+    )
+    if missing_shards:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
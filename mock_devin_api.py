@@ -0,0 +1,248 @@
+import argparse
+import asyncio
+import itertools
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+from aiohttp import web
+
+from devin_api_client import TokenBucket
+
+
+@dataclass
+class TimelineStep:
+    """A session state, entered `at` seconds after the session was started."""
+
+    at: float
+    status_enum: str
+    structured_output: dict = field(default_factory=dict)
+
+
+def default_timeline(
+    min_duration: float = 60, max_duration: float = 600, failure_rate: float = 0.1
+) -> list[TimelineStep]:
+    """A QA-like session: works for a while, writes its verdict, then blocks."""
+    duration = random.uniform(min_duration, max_duration)
+    success = random.random() >= failure_rate
+    output = {
+        "success": success,
+        "message": "All steps passed" if success else "Step 3 failed",
+    }
+    return [
+        TimelineStep(0, "working"),
+        TimelineStep(duration, "working", output),
+        TimelineStep(duration + min_duration / 10, "blocked", output),
+    ]
+
+
+@dataclass
+class MockSession:
+    session_id: str
+    prompt: str
+    created_at: float
+    timeline: list[TimelineStep]
+    stopped_at: float | None = None
+
+    def state_at(self, now: float) -> TimelineStep:
+        if self.stopped_at is not None and now >= self.stopped_at:
+            return TimelineStep(self.stopped_at - self.created_at, "stopped")
+        state = self.timeline[0]
+        for step in self.timeline:
+            if now - self.created_at >= step.at:
+                state = step
+        return state
+
+    @property
+    def finished_at(self) -> float:
+        """When the verdict became available, on the `time.monotonic` clock."""
+        for step in self.timeline:
+            if step.structured_output:
+                return self.created_at + step.at
+        return self.created_at + self.timeline[-1].at
+
+
+class MockDevinAPI:
+    """In-process stand-in for the Devin API, for local runs and benchmarks.
+
+    Serves `/v1/auth_status`, `/v1/sessions`, `/v1/session/{id}` (plus
+    messages and stops) on top of an aiohttp web app. Every response waits a
+    random `latency`, `error_rate` of requests fail with a 503, and with
+    `rate_limit` set requests beyond that budget get a 429 with
+    `Retry-After`. Each session follows the timeline returned by
+    `timeline_factory`; a message restarts the timeline, like a follow-up test
+    sent to a batched session.
+    """
+
+    def __init__(
+        self,
+        latency: tuple[float, float] = (0.0, 0.0),
+        error_rate: float = 0.0,
+        rate_limit: float | None = None,
+        burst: int = 20,
+        timeline_factory=default_timeline,
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limiter = TokenBucket(rate_limit, burst) if rate_limit else None
+        self.timeline_factory = timeline_factory
+        self.sessions: dict[str, MockSession] = {}
+        self.request_counts: dict[str, int] = {}
+        self._ids = itertools.count(1)
+        self._runner: web.AppRunner | None = None
+        self.app = web.Application(middlewares=[self._middleware])
+        self.app.add_routes(
+            [
+                web.get("/v1/auth_status", self._auth_status),
+                web.post("/v1/sessions", self._start_session),
+                web.get("/v1/session/{session_id}", self._session_status),
+                web.post("/v1/session/{session_id}/message", self._send_message),
+                web.delete("/v1/sessions/{session_id}", self._stop_session),
+            ]
+        )
+
+    @property
+    def total_requests(self) -> int:
+        return sum(self.request_counts.values())
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start serving and return the base URL to give `DevinAPIClient`."""
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        return f"http://{host}:{port}/v1"
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "MockDevinAPI":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler) -> web.StreamResponse:
+        route = request.match_info.route.resource
+        key = f"{request.method} {route.canonical if route else request.path}"
+        self.request_counts[key] = self.request_counts.get(key, 0) + 1
+        if self.latency[1] > 0:
+            await asyncio.sleep(random.uniform(*self.latency))
+        if self.rate_limiter:
+            wait = self.rate_limiter.try_acquire()
+            if wait:
+                return web.json_response(
+                    {"detail": "Rate limited"},
+                    status=429,
+                    headers={"Retry-After": str(max(1, round(wait)))},
+                )
+        if random.random() < self.error_rate:
+            return web.json_response({"detail": "Unavailable"}, status=503)
+        return await handler(request)
+
+    def _get_session(self, request: web.Request) -> MockSession:
+        session = self.sessions.get(request.match_info["session_id"])
+        if session is None:
+            raise web.HTTPNotFound()
+        return session
+
+    async def _auth_status(self, request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok", "message": "Mock API"})
+
+    async def _start_session(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        session_id = f"devin-mock{next(self._ids)}"
+        self.sessions[session_id] = MockSession(
+            session_id=session_id,
+            prompt=payload["prompt"],
+            created_at=time.monotonic(),
+            timeline=self.timeline_factory(),
+        )
+        return web.json_response(
+            {
+                "session_id": session_id,
+                "url": f"https://app.devin.ai/sessions/{session_id}",
+                "is_new_session": True,
+            }
+        )
+
+    async def _session_status(self, request: web.Request) -> web.Response:
+        session = self._get_session(request)
+        state = session.state_at(time.monotonic())
+        now = datetime.now(timezone.utc).isoformat()
+        return web.json_response(
+            {
+                "session_id": session.session_id,
+                "status": state.status_enum,
+                "title": session.prompt[:40],
+                "created_at": now,
+                "updated_at": now,
+                "snapshot_id": None,
+                "playbook_id": None,
+                "structured_output": state.structured_output,
+                "status_enum": state.status_enum,
+            }
+        )
+
+    async def _send_message(self, request: web.Request) -> web.Response:
+        session = self._get_session(request)
+        session.created_at = time.monotonic()
+        session.timeline = self.timeline_factory()
+        return web.json_response({})
+
+    async def _stop_session(self, request: web.Request) -> web.Response:
+        session = self._get_session(request)
+        if session.stopped_at is None:
+            session.stopped_at = time.monotonic()
+        return web.json_response({})
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description="Serve a mock Devin API. Run the QA runner against it with "
+        "DEVIN_API_BASE_URL=http://127.0.0.1:<port>/v1."
+    )
+    parser.add_argument("--port", type=int, default=8123)
+    parser.add_argument(
+        "--min-duration", type=float, default=60, help="Shortest session (seconds)"
+    )
+    parser.add_argument(
+        "--max-duration", type=float, default=600, help="Longest session (seconds)"
+    )
+    parser.add_argument(
+        "--failure-rate", type=float, default=0.1, help="Share of failing tests"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Max response latency (seconds)"
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="Share of 503 responses"
+    )
+    parser.add_argument(
+        "--rate-limit", type=float, help="Requests per second before 429s"
+    )
+    parser.add_argument("--burst", type=int, default=20)
+    args = parser.parse_args()
+
+    api = MockDevinAPI(
+        latency=(0.0, args.latency),
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+        burst=args.burst,
+        timeline_factory=lambda: default_timeline(
+            args.min_duration, args.max_duration, args.failure_rate
+        ),
+    )
+    async with api:
+        base_url = await api.start(port=args.port)
+        print(f"Mock Devin API listening on {base_url}")
+        await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
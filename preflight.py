@@ -0,0 +1,88 @@
+import asyncio
+
+import aiohttp
+
+from devin_api_client import DevinAPIClient, DevinAPIClientPool
+
+URL_CHECK_TIMEOUT = aiohttp.ClientTimeout(total=15)
+
+
+class PreflightError(Exception):
+    """The run is misconfigured; raised before any session is launched."""
+
+    def __init__(self, problems: list[str]):
+        self.problems = problems
+        super().__init__(
+            "Pre-flight checks failed:\n"
+            + "\n".join(f"- {problem}" for problem in problems)
+        )
+
+
+def check_prompts(prompts: dict[str, tuple[str, dict[str, str]]]) -> list[str]:
+    """Render every prompt template with its parameters."""
+    problems = []
+    for name, (template, params) in prompts.items():
+        try:
+            template.format(**params)
+        except KeyError as e:
+            problems.append(f"Prompt of {name} uses unknown placeholder {e}")
+        except (IndexError, ValueError) as e:
+            problems.append(f"Prompt of {name} is not a valid template: {e}")
+    return problems
+
+
+async def check_auth(client: DevinAPIClient | DevinAPIClientPool) -> list[str]:
+    try:
+        await client.check_auth()
+    except aiohttp.ClientResponseError as e:
+        return [f"Devin API rejected the API key: {e.status} {e.message}"]
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        return [f"Devin API is unreachable: {str(e) or type(e).__name__}"]
+    return []
+
+
+def is_missing(status: int) -> bool:
+    """Whether a response shows the URL is gone or its server is broken.
+
+    Anything else, including 401 from an app behind HTTP basic auth, means
+    the server is there and the session can take it from there.
+    """
+    return status in (404, 410) or status >= 500
+
+
+async def check_url(session: aiohttp.ClientSession, name: str, url: str) -> list[str]:
+    try:
+        async with session.head(url, allow_redirects=True) as response:
+            status = response.status
+        if status == 405 or is_missing(status):
+            # Some servers (e.g. presigned URLs) only answer GET
+            async with session.get(url, allow_redirects=True) as response:
+                status = response.status
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+        return [f"{name} {url} is unreachable: {str(e) or type(e).__name__}"]
+    if is_missing(status):
+        return [f"{name} {url} returned {status}"]
+    return []
+
+
+async def run_preflight(
+    client: DevinAPIClient | DevinAPIClientPool,
+    prompts: dict[str, tuple[str, dict[str, str]]],
+    urls: dict[str, str],
+) -> None:
+    """Validate a run concurrently, raising PreflightError with every problem.
+
+    `prompts` maps a test or fixture name to its template and the parameters
+    it will be rendered with; `urls` maps a flag name to the URL to check.
+    """
+    # A separate session, so the Devin API key is never sent to other hosts
+    async with aiohttp.ClientSession(timeout=URL_CHECK_TIMEOUT) as session:
+        results = await asyncio.gather(
+            check_auth(client),
+            *(check_url(session, name, url) for name, url in urls.items()),
+        )
+    problems = check_prompts(prompts) + [
+        problem for result in results for problem in result
+    ]
+    if problems:
+        raise PreflightError(problems)
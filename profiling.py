@@ -0,0 +1,137 @@
+import asyncio
+import bisect
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+
+from devin_api_client import RequestEvent
+
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, float("inf")]
+
+
+class RequestStats:
+    """Request hook that aggregates Devin API calls per operation.
+
+    Keeps a latency histogram, response status counts (`error` for attempts
+    that got no response) and the number of retried attempts.
+    """
+
+    def __init__(self):
+        self.histograms: dict[str, list[int]] = {}
+        self.latency_sums: dict[str, float] = {}
+        self.status_counts: dict[str, Counter] = {}
+        self.retries: Counter = Counter()
+
+    def __call__(self, event: RequestEvent) -> None:
+        operation = event["operation"]
+        histogram = self.histograms.setdefault(operation, [0] * len(LATENCY_BUCKETS))
+        histogram[bisect.bisect_left(LATENCY_BUCKETS, event["latency"])] += 1
+        self.latency_sums[operation] = (
+            self.latency_sums.get(operation, 0.0) + event["latency"]
+        )
+        status = str(event["status"]) if event["status"] is not None else "error"
+        self.status_counts.setdefault(operation, Counter())[status] += 1
+        if event["will_retry"]:
+            self.retries[operation] += 1
+
+    def report(self) -> dict:
+        report = {}
+        for operation, histogram in self.histograms.items():
+            count = sum(histogram)
+            report[operation] = {
+                "requests": count,
+                "mean_latency": round(self.latency_sums[operation] / count, 4),
+                "latency_histogram": {
+                    f"le_{bound}": bucket_count
+                    for bound, bucket_count in zip(LATENCY_BUCKETS, histogram)
+                },
+                "status_counts": dict(self.status_counts[operation]),
+                "retries": self.retries[operation],
+            }
+        return report
+
+
+class LoopLagMonitor:
+    """Measures event loop lag and flags stalls with the code causing them.
+
+    A heartbeat task wakes every `interval`; how late it wakes is the loop
+    lag. A watchdog thread notices when the heartbeat is overdue by more than
+    `threshold` and captures the loop thread's stack at that moment, which
+    shows the blocking call (e.g. a synchronous request) while it still runs.
+    """
+
+    def __init__(self, threshold: float = 0.1, interval: float = 0.05):
+        self.threshold = threshold
+        self.interval = interval
+        self.lags: list[float] = []
+        self.stalls: list[dict] = []
+        self._beat = time.monotonic()
+        self._callsite: list[str] | None = None
+        self._loop_thread_id: int | None = None
+        self._task: asyncio.Task | None = None
+        self._thread: threading.Thread | None = None
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    async def _heartbeat(self) -> None:
+        while True:
+            self._beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - self._beat - self.interval)
+            self.lags.append(lag)
+            if lag > self.threshold:
+                self.stalls.append(
+                    {"duration": round(lag, 3), "callsite": self._callsite}
+                )
+            self._callsite = None
+
+    def _watch(self) -> None:
+        while not self._stopped.wait(self.interval):
+            overdue = time.monotonic() - self._beat - self.interval
+            if overdue <= self.threshold or self._callsite is not None:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is not None:
+                # The innermost frames outside asyncio are the code blocking it
+                stack = [
+                    entry
+                    for entry in traceback.extract_stack(frame)
+                    if f"{os.sep}asyncio{os.sep}" not in entry.filename
+                ]
+                self._callsite = [
+                    f"{entry.filename}:{entry.lineno} in {entry.name}"
+                    for entry in stack[-5:]
+                ]
+
+    def report(self) -> dict:
+        lags = sorted(self.lags)
+        if not lags:
+            return {"samples": 0, "stalls": self.stalls}
+        return {
+            "samples": len(lags),
+            "p50": round(lags[len(lags) // 2], 4),
+            "p99": round(lags[min(len(lags) - 1, int(len(lags) * 0.99))], 4),
+            "max": round(lags[-1], 4),
+            "stalls": self.stalls,
+        }
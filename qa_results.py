@@ -0,0 +1,22 @@
+import json
+from typing import TypedDict
+
+
+class QATestResult(TypedDict):
+    test_name: str
+    session_id: str
+    session_url: str
+    status_enum: str
+    success: bool
+    message: str
+    duration: float
+
+
+def write_results(path: str, results: list[QATestResult], **metadata) -> None:
+    with open(path, "w") as f:
+        json.dump({**metadata, "results": results}, f, indent=2)
+
+
+def load_results(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
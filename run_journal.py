@@ -0,0 +1,102 @@
+import json
+import os
+import time
+
+from qa_results import QATestResult
+
+DEFAULT_JOURNAL_DIR = "qa_runs"
+
+
+def new_run_id() -> str:
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+
+
+class RunJournal:
+    """Append-only JSON lines journal of one run.
+
+    Every launched session, session state change, fixture output and test
+    result is written (and fsynced) as soon as it happens, so a run that dies
+    part way can be resumed from the journal without relaunching its sessions.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.run_id = os.path.splitext(os.path.basename(path))[0]
+        self.run_options: dict = {}
+        # test_name -> (session_id, session_url, launched_at)
+        self.launched: dict[str, tuple[str, str, float]] = {}
+        self.results: dict[str, QATestResult] = {}
+        # fixture_name -> outputs captured from the fixture's structured output
+        self.fixture_outputs: dict[str, dict[str, str]] = {}
+        if os.path.exists(path):
+            self._load()
+
+    @classmethod
+    def for_run(
+        cls, run_id: str, journal_dir: str = DEFAULT_JOURNAL_DIR
+    ) -> "RunJournal":
+        os.makedirs(journal_dir, exist_ok=True)
+        return cls(os.path.join(journal_dir, f"{run_id}.jsonl"))
+
+    def _load(self) -> None:
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash can leave a partially written last line
+                    continue
+                if entry["event"] == "run_started":
+                    self.run_options = entry["options"]
+                elif entry["event"] == "session_launched":
+                    self.launched[entry["test_name"]] = (
+                        entry["session_id"],
+                        entry["session_url"],
+                        entry["time"],
+                    )
+                elif entry["event"] == "session_stopped":
+                    self.launched.pop(entry["test_name"], None)
+                elif entry["event"] == "result":
+                    self.results[entry["result"]["test_name"]] = entry["result"]
+                elif entry["event"] == "fixture_outputs":
+                    self.fixture_outputs[entry["fixture_name"]] = entry["outputs"]
+
+    def _append(self, event: str, **fields) -> None:
+        with open(self.path, "a") as f:
+            f.write(json.dumps({"event": event, "time": time.time(), **fields}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def record_run_started(self, options: dict) -> None:
+        self.run_options = options
+        self._append("run_started", options=options)
+
+    def record_launched(
+        self, test_name: str, session_id: str, session_url: str
+    ) -> None:
+        self.launched[test_name] = (session_id, session_url, time.time())
+        self._append(
+            "session_launched",
+            test_name=test_name,
+            session_id=session_id,
+            session_url=session_url,
+        )
+
+    def record_stopped(self, test_name: str) -> None:
+        """Forget a session stopped before its test finished, so a resumed
+        run launches the test again instead of reattaching."""
+        self.launched.pop(test_name, None)
+        self._append("session_stopped", test_name=test_name)
+
+    def record_state(self, session_id: str, status_enum: str | None) -> None:
+        self._append("session_state", session_id=session_id, status_enum=status_enum)
+
+    def record_result(self, result: QATestResult) -> None:
+        self.results[result["test_name"]] = result
+        self._append("result", result=result)
+
+    def record_fixture_outputs(
+        self, fixture_name: str, outputs: dict[str, str]
+    ) -> None:
+        self.fixture_outputs[fixture_name] = outputs
+        self._append("fixture_outputs", fixture_name=fixture_name, outputs=outputs)
@@ -1,15 +1,42 @@
 import argparse
 import asyncio
+import json
 import os
+import signal
 import sys
 import time
-from typing import TypedDict
+from typing import Callable
 
 from dotenv import load_dotenv
-from slack_sdk import WebClient
-from tests import QA_TESTS
-
-from devin_api_client import DevinAPIClient, DevinAPISessionStatusResponse
+from slack_sdk.web.async_client import AsyncWebClient
+from tests import (
+    BATCHED_TEST_INSTRUCTIONS,
+    QA_FIXTURES,
+    QAFixture,
+    QATest,
+    build_session_options,
+    fixture_copies_prompt,
+    fixture_copy_output,
+    select_qa_tests,
+)
+
+from devin_api_client import (
+    DEFAULT_BASE_URL,
+    DevinAPIClient,
+    DevinAPIClientPool,
+    DevinAPISessionOptions,
+    DevinAPISessionStatusResponse,
+    parse_api_keys,
+)
+from duration_history import TestTiming, median_durations, record_timings
+from lifecycle_metrics import RunMetrics
+from preflight import PreflightError, run_preflight
+from profiling import LoopLagMonitor, RequestStats
+from qa_results import QATestResult, write_results
+from run_journal import DEFAULT_JOURNAL_DIR, RunJournal, new_run_id
+from scheduler import ResourceLocks, SessionSlots, parse_shard, shard_by_duration
+from session_poller import TERMINAL_STATUS_ENUMS, SessionPoller, is_terminal
+from slack_reporter import SlackReporter
 
 # Load environment variables from .env file
 load_dotenv()
@@ -17,46 +44,127 @@ load_dotenv()
 # Default Slack channel for test results
 SLACK_TEST_RESULTS_CHANNEL_ID = os.getenv("SLACK_CHANNEL_ID", "test-results")
 
-DEVIN_API_KEY = os.getenv("DEVIN_API_KEY")
-if not DEVIN_API_KEY:
-    raise ValueError("DEVIN_API_KEY environment variable is required")
-
-devin_api_client = DevinAPIClient(DEVIN_API_KEY)
+# Comma-separated keys, each optionally with its max concurrent sessions
+# ("key1:10,key2:5"), to spread a run over several organizations
+DEVIN_API_KEYS = parse_api_keys(
+    os.getenv("DEVIN_API_KEYS") or os.getenv("DEVIN_API_KEY") or ""
+)
+if not DEVIN_API_KEYS:
+    raise ValueError("DEVIN_API_KEY or DEVIN_API_KEYS environment variable is required")
+
+# Point the runner at another API, e.g. the local mock in mock_devin_api.py
+DEVIN_API_BASE_URL = os.getenv("DEVIN_API_BASE_URL") or DEFAULT_BASE_URL
+
+# Max pooled connections to the Devin API per key, shared by all polls in a run
+DEVIN_API_MAX_CONNECTIONS = int(os.getenv("DEVIN_API_MAX_CONNECTIONS") or 20)
+
+# Client-side request budget per API key (requests/sec and burst size)
+DEVIN_API_RATE_LIMIT = float(os.getenv("DEVIN_API_RATE_LIMIT") or 10)
+DEVIN_API_BURST = int(os.getenv("DEVIN_API_BURST") or 20)
+# Hedge status requests slower than this latency percentile (disabled if unset)
+DEVIN_API_HEDGE_PERCENTILE = float(os.getenv("DEVIN_API_HEDGE_PERCENTILE") or 0) or None
+
+devin_api_client = DevinAPIClientPool(
+    [
+        DevinAPIClient(
+            api_key,
+            limit_per_host=DEVIN_API_MAX_CONNECTIONS,
+            rate_limit=DEVIN_API_RATE_LIMIT,
+            burst=DEVIN_API_BURST,
+            hedge_percentile=DEVIN_API_HEDGE_PERCENTILE,
+            base_url=DEVIN_API_BASE_URL,
+        )
+        for api_key, _ in DEVIN_API_KEYS
+    ],
+    [capacity for _, capacity in DEVIN_API_KEYS],
+)
 SLACK_BOT_TOKEN = os.getenv("SLACK_BOT_TOKEN", "")
-slack_client = WebClient(token=SLACK_BOT_TOKEN)
+slack_client = AsyncWebClient(token=SLACK_BOT_TOKEN)
+# Max Slack thread replies posted at once
+SLACK_MAX_CONCURRENT_POSTS = 4
+
 
+MAX_TIME_PER_TEST = 30 * 60  # 30 minutes
+# Max stop requests sent at once when sessions are abandoned
+MAX_CONCURRENT_STOPS = 10
 
-class QATestResult(TypedDict):
-    test_name: str
-    session_id: str
-    session_url: str
-    status_enum: str
-    success: bool
-    message: str
 
+async def stop_sessions(
+    session_ids: list[str], max_concurrency: int = MAX_CONCURRENT_STOPS
+) -> None:
+    """Stop sessions so they stop holding org session slots."""
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def stop(session_id: str) -> None:
+        async with semaphore:
+            try:
+                await devin_api_client.stop_session(session_id)
+                print(f"Stopped session {session_id}")
+            except Exception as e:
+                print(f"Failed to stop session {session_id}: {e}")
+
+    await asyncio.gather(*(stop(session_id) for session_id in session_ids))
 
-MAX_TIME_PER_TEST = 30 * 60  # 30 minutes
+
+def time_limit(test: QATest) -> float:
+    return test["max_duration"] or MAX_TIME_PER_TEST
+
+
+def fixture_params(
+    test: QATest, fixture: QAFixture, outputs: dict[str, str]
+) -> dict[str, str]:
+    """The fixture outputs a test's prompt is rendered with."""
+    if test["own_fixture"]:
+        return {
+            key: outputs[fixture_copy_output(key, test["test_name"])]
+            for key in fixture["outputs"]
+        }
+    return {key: outputs[key] for key in fixture["outputs"]}
 
 
 async def poll_session_and_eval(
-    test_name: str, session_id: str, session_url: str
+    poller: SessionPoller,
+    test_name: str,
+    session_id: str,
+    session_url: str,
+    expected_duration: float | None = None,
+    stop_finished_session: bool = False,
+    max_duration: float = MAX_TIME_PER_TEST,
+    output_test_name: str | None = None,
+    max_polls: int | None = None,
+    started_at: float | None = None,
+    follow_up: bool = False,
 ) -> QATestResult:
-    status = None
-    start_time = time.time()
-    while True:
-        status: DevinAPISessionStatusResponse | None = (
-            await devin_api_client.get_session_status(session_id)
-        )
-        if (
-            status
-            and status["status_enum"] is not None
-            and status["status_enum"].lower() in ["blocked", "stopped"]
-        ):
-            break
-
-        if time.time() - start_time > MAX_TIME_PER_TEST:
-            break
-        await asyncio.sleep(20)
+    # A reattached session started before this process; time it from its launch
+    start_time = started_at or time.time()
+    status: DevinAPISessionStatusResponse | None = await poller.watch(
+        session_id,
+        max_duration,
+        expected_duration,
+        output_test_name,
+        max_polls,
+        follow_up,
+        elapsed=time.time() - start_time,
+    )
+    duration = time.time() - start_time
+
+    # In a shared session the output may still be the previous test's verdict
+    if (
+        output_test_name
+        and status
+        and (status["structured_output"] or {}).get("test_name") != output_test_name
+    ):
+        status = {**status, "structured_output": {}}
+
+    if status and not is_terminal(status):
+        if not isinstance((status["structured_output"] or {}).get("success"), bool):
+            # Out of time or polls without a verdict; don't let it hold its slot
+            print(f"{test_name} ran out of time or polls, stopping {session_url}")
+            await stop_sessions([session_id])
+            status = {**status, "status_enum": "stopped"}
+        elif stop_finished_session:
+            # The verdict may arrive while the session is still working
+            await stop_sessions([session_id])
 
     if not status or not status["structured_output"]:
         return {
@@ -68,6 +176,7 @@ async def poll_session_and_eval(
             ),
             "success": False,
             "message": "No structured IO",
+            "duration": duration,
         }
 
     success: bool = status["structured_output"].get("success", False)
@@ -79,48 +188,55 @@ async def poll_session_and_eval(
         "status_enum": status["status_enum"] or "unknown",
         "success": success,
         "message": message,
+        "duration": duration,
     }
     print(f"Test finished: {x}")
     return x
 
 
-async def send_final_results_to_slack(results: list[QATestResult]):
-    # Post session links to slack
-    slack_summary = "*QA Test Results*\n"
-    slack_summary += f"*Command*: `python3 {' '.join(sys.argv)}`\n"
-    slack_summary += "-" * 100 + "\n"
-
-    # Add results to summary
-    for result in results:
-        emoji = "✅" if result["success"] else "❌"
-        slack_summary += f"{emoji} *<{result['session_url']}|{result['test_name']}>*\n"
-
-    thread_ts = None
-    if SLACK_BOT_TOKEN:
-        main_message = slack_client.chat_postMessage(
-            channel=SLACK_TEST_RESULTS_CHANNEL_ID,
-            text=slack_summary,
-        )
-        print(main_message)
-
-        # Post detailed results in thread
-        thread_ts = main_message["ts"]
-
-    for result in results:
-        thread_message = (
-            f"Detailed results for <{result['session_url']}|{result['test_name']}>:\n"
-        )
-        thread_message += f"Status: {result['status_enum']}\n"
-        if result["message"]:
-            thread_message += f"Message: {result['message']}\n"
-
-        if SLACK_BOT_TOKEN and thread_ts:
-            slack_client.chat_postMessage(
-                channel=SLACK_TEST_RESULTS_CHANNEL_ID,
-                thread_ts=thread_ts,
-                text=thread_message,
+class SessionLauncher:
+    """Starts sessions concurrently under a concurrency cap and launch rate.
+
+    At most `max_concurrency` start requests are in flight at once and, if
+    `launch_rate` is set, launches are spaced to that many sessions/sec.
+    `on_launched(test_name, session_id, session_url)` is called as soon as
+    each session has started.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        launch_rate: float | None = None,
+        on_launched: Callable[[str, str, str], None] | None = None,
+    ):
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._interval = 1 / launch_rate if launch_rate else 0
+        self._next_launch_at = time.monotonic()
+        self.on_launched = on_launched
+
+    async def launch(
+        self,
+        test_name: str,
+        prompt: str,
+        options: DevinAPISessionOptions | None = None,
+    ) -> tuple[str, str]:
+        if self._interval:
+            now = time.monotonic()
+            delay = self._next_launch_at - now
+            self._next_launch_at = max(self._next_launch_at, now) + self._interval
+            if delay > 0:
+                await asyncio.sleep(delay)
+        async with self._semaphore:
+            session_response = await devin_api_client.start_session(
+                prompt, options=options
             )
-        print(thread_message)
+        assert session_response["session_id"] is not None
+        print(f"Started session for {test_name}: {session_response['url']}")
+        if self.on_launched:
+            self.on_launched(
+                test_name, session_response["session_id"], session_response["url"]
+            )
+        return session_response["session_id"], session_response["url"]
 
 
 async def run_tests_and_send_to_slack(
@@ -129,75 +245,487 @@ async def run_tests_and_send_to_slack(
     external_api_specs_url: str,
     sample_pdf_url: str,
     johndoejunior_zip_url: str,
-):
-    eval_tasks = []
-    session_links: list[tuple[str, str, str]] = []
-    for test in QA_TESTS:
-        if test_names and test["test_name"] not in test_names:
-            continue
-        prompt = test["user_prompt"].format(
-            url=url,
-            external_api_specs_url=external_api_specs_url,
-            sample_pdf_url=sample_pdf_url,
-            johndoejunior_zip_url=johndoejunior_zip_url,
+    tags: list[str] | None = None,
+    exclude_tags: list[str] | None = None,
+    max_concurrent_launches: int = 10,
+    launch_rate: float | None = None,
+    poll_interval: float = 20,
+    max_concurrent_polls: int = 10,
+    min_poll_interval: float = 5,
+    max_poll_interval: float = 60,
+    durations_file: str = "qa_test_durations.json",
+    finish_on_structured_output: bool = True,
+    stop_finished_sessions: bool = False,
+    journal: RunJournal | None = None,
+    batch_size: int = 1,
+    default_session_options: DevinAPISessionOptions | None = None,
+    max_concurrent_sessions: int | None = None,
+    shard: tuple[int, int] | None = None,
+    report_to_slack: bool = True,
+    metrics: RunMetrics | None = None,
+    preflight: bool = True,
+    interrupt: asyncio.Event | None = None,
+    suite_timeout: float | None = None,
+) -> list[QATestResult]:
+    """Run the selected tests and report them as they finish.
+
+    If `interrupt` is set, or `suite_timeout` seconds pass, before all tests
+    finish, the unfinished tests are cancelled, their sessions are stopped,
+    the summary is marked as interrupted and only the results collected so
+    far are returned.
+    """
+    interrupt = interrupt or asyncio.Event()
+    if suite_timeout is not None:
+
+        def on_suite_timeout() -> None:
+            print(f"Suite deadline of {suite_timeout:.0f}s reached")
+            interrupt.set()
+
+        suite_deadline = asyncio.get_running_loop().call_later(
+            suite_timeout, on_suite_timeout
         )
-        session_response = await devin_api_client.start_session(prompt)
-        assert session_response["session_id"] is not None
-        session_id = session_response["session_id"]
-        session_url = session_response["url"]
+    journal = journal or RunJournal.for_run(new_run_id())
+    metrics = metrics or RunMetrics(journal.run_id)
+    selected_tests = select_qa_tests(test_names, tags, exclude_tags)
+    expected_durations = median_durations(durations_file)
+
+    def expected_duration(test: QATest) -> float:
+        # Tests without history are assumed long, so they are not left for last
+        return expected_durations.get(test["test_name"], time_limit(test))
+
+    if shard:
+        index, count = shard
+        shard_test_names = shard_by_duration(
+            [test["test_name"] for test in selected_tests],
+            {test["test_name"]: expected_duration(test) for test in selected_tests},
+            count,
+        )[index - 1]
+        selected_tests = [
+            test for test in selected_tests if test["test_name"] in shard_test_names
+        ]
+        print(f"Shard {index}/{count}: {', '.join(shard_test_names) or 'no tests'}")
+    render_params = {
+        "url": url,
+        "external_api_specs_url": external_api_specs_url,
+        "sample_pdf_url": sample_pdf_url,
+        "johndoejunior_zip_url": johndoejunior_zip_url,
+    }
+    fixtures_by_name = {fixture["fixture_name"]: fixture for fixture in QA_FIXTURES}
+    used_fixtures = {test["fixture"] for test in selected_tests if test["fixture"]}
+
+    if preflight:
+        # Catch bad templates, keys and URLs before paying for any session
+        prompts = {
+            f"fixture-{fixture_name}": (
+                fixtures_by_name[fixture_name]["user_prompt"],
+                render_params,
+            )
+            for fixture_name in used_fixtures
+        }
+        for test in selected_tests:
+            params = render_params
+            if test["fixture"]:
+                # Fixture outputs are only known at run time
+                fixture_outputs = fixtures_by_name[test["fixture"]]["outputs"]
+                params = {**render_params, **{key: key for key in fixture_outputs}}
+            prompts[test["test_name"]] = (test["load_prompt"](), params)
+        await run_preflight(
+            devin_api_client,
+            prompts,
+            {
+                "--url": url,
+                "--external-api-specs-url": external_api_specs_url,
+                "--sample-pdf-url": sample_pdf_url,
+                "--johndoejunior-zip-url": johndoejunior_zip_url,
+            },
+        )
+        print("Pre-flight checks passed")
 
-        eval_tasks.append(
-            asyncio.create_task(
-                poll_session_and_eval(test["test_name"], session_id, session_url)
+    def unfinished_sessions() -> dict[str, str]:
+        """Tests and fixtures that were launched but never finished."""
+        return {
+            name: session_id
+            for name, (session_id, _, _) in journal.launched.items()
+            if name not in journal.results
+            and name.removeprefix("fixture-") not in journal.fixture_outputs
+        }
+
+    # Sessions of a resumed run occupy their keys before anything new starts
+    await devin_api_client.reattach(list(unfinished_sessions().values()))
+
+    poller = SessionPoller(
+        devin_api_client,
+        poll_interval=poll_interval,
+        max_in_flight=max_concurrent_polls,
+        min_interval=min_poll_interval,
+        max_interval=max_poll_interval,
+        complete_on_structured_output=finish_on_structured_output,
+        on_status_change=lambda session_id, status: journal.record_state(
+            session_id, status["status_enum"] if status else None
+        ),
+        on_poll=metrics.record_poll,
+    )
+    poller.start()
+    launcher = SessionLauncher(
+        max_concurrent_launches, launch_rate, on_launched=journal.record_launched
+    )
+    # Never queue more sessions than all API keys together can run
+    slots = SessionSlots(max_concurrent_sessions or devin_api_client.total_capacity)
+    locks = ResourceLocks()
+    timings: dict[str, TestTiming] = {}
+
+    reporter = SlackReporter(
+        slack_client if SLACK_BOT_TOKEN and report_to_slack else None,
+        SLACK_TEST_RESULTS_CHANNEL_ID,
+        command=f"python3 {' '.join(sys.argv)}",
+        max_concurrent_posts=SLACK_MAX_CONCURRENT_POSTS,
+    )
+    await reporter.start([test["test_name"] for test in selected_tests])
+
+    def session_options(
+        options: DevinAPISessionOptions,
+    ) -> DevinAPISessionOptions:
+        # Options declared on a test or fixture win over the run-wide defaults
+        return {**(default_session_options or {}), **options}
+
+    async def start_session(
+        name: str, prompt: str, options: DevinAPISessionOptions
+    ) -> tuple[str, str, float]:
+        # When resuming, sessions from the journal are reattached, not relaunched
+        if name not in journal.launched:
+            launch_started = time.monotonic()
+            session_id, _ = await launcher.launch(
+                name, prompt, session_options(options)
+            )
+            metrics.record_launched(name, session_id, time.monotonic() - launch_started)
+        else:
+            metrics.record_launched(name, journal.launched[name][0], event="reattached")
+        return journal.launched[name]
+
+    async def run_fixture(fixture: QAFixture, copies: list[str]) -> dict[str, str]:
+        fixture_name = fixture["fixture_name"]
+        if fixture_name in journal.fixture_outputs:
+            return journal.fixture_outputs[fixture_name]
+        # Dependent tests wait for the fixture, so it is admitted first
+        metrics.record_event(f"fixture-{fixture_name}", "queued")
+        await locks.acquire(fixture["reads"], fixture["writes"], float("inf"))
+        try:
+            await slots.acquire(priority=float("inf"))
+        except BaseException:
+            locks.release(fixture["reads"], fixture["writes"])
+            raise
+        metrics.record_event(f"fixture-{fixture_name}", "admitted")
+        session_id = ""
+        try:
+            session_id, session_url, launched_at = await start_session(
+                f"fixture-{fixture_name}",
+                fixture["user_prompt"].format(**render_params)
+                + (fixture_copies_prompt(fixture, copies) if copies else ""),
+                fixture["session_options"],
             )
+            max_duration = max(0.0, MAX_TIME_PER_TEST - (time.time() - launched_at))
+            status = await poller.watch(session_id, max_duration)
+            if (
+                status
+                and not is_terminal(status)
+                and not (status["structured_output"] or {}).get("success")
+            ):
+                # Timed out; dependent tests fail, so don't keep the slot
+                await stop_sessions([session_id])
+        finally:
+            slots.release()
+            locks.release(fixture["reads"], fixture["writes"])
+            await devin_api_client.session_finished(session_id)
+        output = (status["structured_output"] if status else None) or {}
+        output_keys = fixture["outputs"] + [
+            fixture_copy_output(key, test_name)
+            for test_name in copies
+            for key in fixture["outputs"]
+        ]
+        succeeded = bool(output.get("success")) and all(
+            output.get(key) for key in output_keys
         )
-        session_links.append((session_id, session_url, test["test_name"]))
-        await asyncio.sleep(0.1)
-    print("Done starting sessions")
-
-    # Send initial message with session links
-    links_message = "*Started QA Test Sessions*\n"
-    links_message += f"*Command*: `python3 {' '.join(sys.argv)}`\n"
-    links_message += "-" * 100 + "\n"
-    for _, session_url, test_name in session_links:
-        links_message += f"• <{session_url}|{test_name}>\n"
-
-    print(links_message)
-
-    if SLACK_BOT_TOKEN:
-        slack_client.chat_postMessage(
-            channel=SLACK_TEST_RESULTS_CHANNEL_ID, text=links_message
+        metrics.record_event(
+            f"fixture-{fixture_name}",
+            "finished",
+            status_enum=status["status_enum"] if status else None,
+            success=succeeded,
         )
+        if not succeeded:
+            raise RuntimeError(
+                f"Fixture {fixture_name} failed ({session_url}): "
+                f"{output.get('message', 'No structured IO')}"
+            )
+        outputs = {key: str(output[key]) for key in output_keys}
+        print(f"Fixture {fixture_name} ready: {outputs}")
+        journal.record_fixture_outputs(fixture_name, outputs)
+        return outputs
+
+    # Each fixture runs once, in one session that also prepares the copies of
+    # the selected tests that need their own
+    fixture_tasks = {
+        fixture_name: asyncio.create_task(
+            run_fixture(
+                fixtures_by_name[fixture_name],
+                [
+                    test["test_name"]
+                    for test in selected_tests
+                    if test["fixture"] == fixture_name and test["own_fixture"]
+                ],
+            )
+        )
+        for fixture_name in used_fixtures
+    }
 
-    # Use return_exceptions=True to prevent exceptions from stopping other tasks
-    results = await asyncio.gather(*eval_tasks, return_exceptions=True)
-
-    # Filter out exceptions and convert them to error results
-    processed_results: list[QATestResult] = []
-    for result, (session_id, session_url, test_name) in zip(results, session_links):
-        if isinstance(result, Exception):
-            processed_results.append(
-                {
-                    "test_name": test_name,
-                    "session_id": session_id,
-                    "session_url": session_url,
-                    "status_enum": "error",
-                    "success": False,
-                    "message": f"Test failed with exception: {str(result)}",
+    async def eval_test(
+        test: QATest,
+        batch: dict | None = None,
+        previous: asyncio.Task | None = None,
+        is_last_in_batch: bool = True,
+        priority: float = 0,
+    ) -> QATestResult:
+        """Run one test, either in its own session or as part of a batch.
+
+        Batched tests share `batch["session"]` and each waits for the
+        `previous` test of its batch before sending its prompt as a message.
+        A session slot is held from session start until the session's last
+        test has finished; waiting tests are admitted by `priority`. The
+        resources a test reads or writes are locked for as long as its slot.
+        """
+        test_name = test["test_name"]
+        if previous is not None:
+            await asyncio.wait({previous})
+        if test_name in journal.results:
+            return journal.results[test_name]
+        slot_holder = batch if batch is not None else {}
+        session_id = session_url = ""
+        queued_at = started_at = time.time()
+        try:
+            params = render_params
+            if test["fixture"]:
+                fixture = fixtures_by_name[test["fixture"]]
+                fixture_outputs = await fixture_tasks[test["fixture"]]
+                params = {
+                    **render_params,
+                    **fixture_params(test, fixture, fixture_outputs),
                 }
+            prompt = test["load_prompt"]().format(**params)
+            output_test_name = None
+            follow_up = False
+            if batch is not None:
+                prompt = BATCHED_TEST_INSTRUCTIONS.format(test_name=test_name) + prompt
+                output_test_name = test_name
+            queued_at = time.time()
+            metrics.record_event(test_name, "queued")
+            if not slot_holder.get("holds_slot"):
+                # Reattached sessions already occupy a slot, admit them first
+                admit_priority = (
+                    float("inf") if test_name in journal.launched else priority
+                )
+                # Lock before taking a slot, so tests waiting on a conflicting
+                # test never sit on a slot others could use
+                resources = batch if batch is not None else test
+                reads, writes = resources["reads"], resources["writes"]
+                await locks.acquire(reads, writes, admit_priority)
+                slot_holder["locks"] = (reads, writes)
+                await slots.acquire(admit_priority)
+                slot_holder["holds_slot"] = True
+            metrics.record_event(test_name, "admitted")
+            if (
+                batch is not None
+                and batch["session"]
+                and test_name not in journal.launched
+                and not batch["idle"]
+            ):
+                # The previous test's verdict can arrive while the session is
+                # still working on it. Wait until it is idle, so that only this
+                # test's work is seen as the session working on the follow-up.
+                previous_session_id = batch["session"][0]
+                idle_status = await poller.watch(
+                    previous_session_id, time_limit(test), until_idle=True
+                )
+                if not is_terminal(idle_status):
+                    # Still busy; run this test in a fresh session instead
+                    await stop_sessions([previous_session_id])
+                    await devin_api_client.session_finished(previous_session_id)
+                    batch["session"] = None
+            if (
+                batch is not None
+                and batch["session"]
+                and test_name not in journal.launched
+            ):
+                session_id, session_url = batch["session"]
+                send_started = time.monotonic()
+                await devin_api_client.send_message(session_id, prompt)
+                print(f"Sent {test_name} to session {session_url}")
+                follow_up = True
+                journal.record_launched(test_name, session_id, session_url)
+                metrics.record_launched(
+                    test_name, session_id, time.monotonic() - send_started, "sent"
+                )
+                launched_at = journal.launched[test_name][2]
+            else:
+                session_id, session_url, launched_at = await start_session(
+                    test_name, prompt, test["session_options"]
+                )
+            if batch is not None:
+                batch["session"] = (session_id, session_url)
+            # The session whose key capacity is released with the slot; in a
+            # batch a later test may fail before it gets to the session
+            slot_holder["session_id"] = session_id
+            started_at = launched_at
+            reporter.set_session_url(test_name, session_url)
+            result = await poll_session_and_eval(
+                poller,
+                test_name,
+                session_id,
+                session_url,
+                expected_durations.get(test_name),
+                stop_finished_sessions and is_last_in_batch,
+                max_duration=max(0.0, time_limit(test) - (time.time() - launched_at)),
+                output_test_name=output_test_name,
+                max_polls=test["max_polls"],
+                started_at=launched_at,
+                follow_up=follow_up,
             )
-        elif isinstance(result, dict):
-            processed_results.append(QATestResult(**result))
-        else:
-            raise ValueError(f"Unknown result type: {type(result)}")
-
-    await send_final_results_to_slack(processed_results)
+        except Exception as e:
+            # Convert exceptions to error results so they don't stop other tests
+            result = QATestResult(
+                test_name=test_name,
+                session_id=session_id,
+                session_url=session_url,
+                status_enum="error",
+                success=False,
+                message=f"Test failed with exception: {str(e)}",
+                duration=0.0,
+            )
+        # Start the rest of the batch in a fresh session if this one is unusable
+        if batch is not None and (
+            result["status_enum"] in ["stopped", "error"]
+            or result["duration"] >= time_limit(test)
+        ):
+            batch["session"] = None
+        if batch is not None:
+            batch["idle"] = result["status_enum"].lower() in TERMINAL_STATUS_ENUMS
+        if slot_holder.get("holds_slot") and (
+            batch is None or is_last_in_batch or batch["session"] is None
+        ):
+            slots.release()
+            slot_holder["holds_slot"] = False
+            locks.release(*slot_holder.pop("locks"))
+            await devin_api_client.session_finished(slot_holder.pop("session_id", ""))
+        timings[test_name] = {
+            "queued_at": queued_at,
+            "started_at": started_at,
+            "finished_at": time.time(),
+            "duration": result["duration"],
+            "status_enum": result["status_enum"],
+            "success": result["success"],
+            "timed_out": result["duration"] >= time_limit(test),
+        }
+        metrics.record_finished(test_name, result)
+        return result
+
+    eval_tasks: list[asyncio.Task] = []
+    if batch_size > 1:
+        # Tests with the same fixture and session options can share a session
+        compatible: dict[tuple[str | None, str], list[QATest]] = {}
+        for test in selected_tests:
+            key = (test["fixture"], json.dumps(test["session_options"], sort_keys=True))
+            compatible.setdefault(key, []).append(test)
+        for compatible_tests in compatible.values():
+            for i in range(0, len(compatible_tests), batch_size):
+                batch_tests = compatible_tests[i : i + batch_size]
+                batch = {
+                    "session": None,
+                    # Whether the session has finished its last test's work
+                    "idle": False,
+                    # The batch's session runs its tests' work, so it locks all
+                    # of their resources
+                    "reads": sorted({r for test in batch_tests for r in test["reads"]}),
+                    "writes": sorted(
+                        {w for test in batch_tests for w in test["writes"]}
+                    ),
+                }
+                # The whole batch runs in the slot taken by its first test
+                batch_duration = sum(expected_duration(test) for test in batch_tests)
+                previous = None
+                for test in batch_tests:
+                    previous = asyncio.create_task(
+                        eval_test(
+                            test,
+                            batch,
+                            previous,
+                            test is batch_tests[-1],
+                            priority=batch_duration,
+                        )
+                    )
+                    eval_tasks.append(previous)
+    else:
+        eval_tasks = [
+            asyncio.create_task(eval_test(test, priority=expected_duration(test)))
+            for test in selected_tests
+        ]
+
+    # Report every result as soon as its test completes
+    results_by_name: dict[str, QATestResult] = {}
+    pending = set(eval_tasks)
+    interrupted = asyncio.create_task(interrupt.wait())
+    while pending and not interrupted.done():
+        done, pending = await asyncio.wait(
+            pending | {interrupted}, return_when=asyncio.FIRST_COMPLETED
+        )
+        pending.discard(interrupted)
+        for task in done - {interrupted}:
+            result = task.result()
+            if result["test_name"] not in journal.results:
+                journal.record_result(result)
+            results_by_name[result["test_name"]] = result
+            await reporter.report(result)
+    interrupted.cancel()
+    if suite_timeout is not None:
+        suite_deadline.cancel()
+
+    if pending:
+        print("Run interrupted, stopping outstanding sessions")
+        unfinished = [*pending, *fixture_tasks.values()]
+        for task in unfinished:
+            task.cancel()
+        await asyncio.gather(*unfinished, return_exceptions=True)
+        abandoned = unfinished_sessions()
+        await stop_sessions(list(set(abandoned.values())))
+        for name in abandoned:
+            journal.record_stopped(name)
+    await poller.stop()
+    await reporter.finish(interrupted=bool(pending))
+
+    record_timings(durations_file, timings)
+    return [
+        results_by_name[test["test_name"]]
+        for test in selected_tests
+        if test["test_name"] in results_by_name
+    ]
 
 
 async def main():
     parser = argparse.ArgumentParser()
     parser.add_argument(
-        "--tests", type=str, help="Comma separated test names to run", default=None
+        "--tests",
+        type=str,
+        help="Comma separated test names or glob patterns to run, e.g. 'test-doclist-*'",
+        default=None,
+    )
+    parser.add_argument(
+        "--tags",
+        type=str,
+        help="Comma separated tags; run only tests with at least one of them",
+        default=None,
+    )
+    parser.add_argument(
+        "--exclude-tags",
+        type=str,
+        help="Comma separated tags; skip tests with any of them",
+        default=None,
     )
     parser.add_argument(
         "--url",
@@ -223,17 +751,268 @@ async def main():
         help="URL for John Doe Junior zip archive",
         default="https://dev-assets.app.usesky.ai/previews/John_Doe_Junior.zip",
     )
+    parser.add_argument(
+        "--max-concurrent-launches",
+        type=int,
+        help="Maximum number of session start requests in flight at once",
+        default=10,
+    )
+    parser.add_argument(
+        "--launch-rate",
+        type=float,
+        help="Maximum sessions started per second (unlimited if not set)",
+        default=None,
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        help="Seconds between status polls of each session",
+        default=20,
+    )
+    parser.add_argument(
+        "--max-concurrent-polls",
+        type=int,
+        help="Maximum number of status requests in flight at once",
+        default=10,
+    )
+    parser.add_argument(
+        "--min-poll-interval",
+        type=float,
+        help="Poll interval right after a status change or near a test's usual duration",
+        default=5,
+    )
+    parser.add_argument(
+        "--max-poll-interval",
+        type=float,
+        help="Upper bound for the poll interval while a session keeps working",
+        default=60,
+    )
+    parser.add_argument(
+        "--durations-file",
+        type=str,
+        help="JSON file with historical test timings used for polling and scheduling",
+        default="qa_test_durations.json",
+    )
+    parser.add_argument(
+        "--finish-on-structured-output",
+        action=argparse.BooleanOptionalAction,
+        help="Treat a test as finished once its structured output is final",
+        default=True,
+    )
+    parser.add_argument(
+        "--stop-finished-sessions",
+        action=argparse.BooleanOptionalAction,
+        help="Stop sessions that are still running after delivering their verdict",
+        default=False,
+    )
+    parser.add_argument(
+        "--resume",
+        type=str,
+        metavar="RUN_ID",
+        help="Resume an interrupted run, reattaching to its running sessions",
+        default=None,
+    )
+    parser.add_argument(
+        "--journal-dir",
+        type=str,
+        help="Directory for run journals",
+        default=DEFAULT_JOURNAL_DIR,
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        help="Run up to this many compatible tests one after another in one session",
+        default=1,
+    )
+    parser.add_argument(
+        "--snapshot-id",
+        type=str,
+        help="Machine snapshot to boot sessions from, unless a test sets its own",
+        default=None,
+    )
+    parser.add_argument(
+        "--playbook-id",
+        type=str,
+        help="Playbook to start sessions with, unless a test sets its own",
+        default=None,
+    )
+    parser.add_argument(
+        "--max-concurrent-sessions",
+        type=int,
+        help="Session quota; tests are admitted longest-expected-first",
+        default=None,
+    )
+    parser.add_argument(
+        "--shard",
+        type=str,
+        metavar="I/N",
+        help="Run only shard I of N, balanced by historical duration. "
+        "Results go to the results file instead of Slack; merge them with "
+        "merge_qa_results.py",
+        default=None,
+    )
+    parser.add_argument(
+        "--metrics-file",
+        type=str,
+        help="Write per-test lifecycle timelines and metrics to this JSON file "
+        "(default qa_metrics.json, or qa_metrics_shard_I_of_N.json)",
+        default=None,
+    )
+    parser.add_argument(
+        "--prometheus-file",
+        type=str,
+        help="Also write the metrics as a Prometheus textfile collector file",
+        default=None,
+    )
+    parser.add_argument(
+        "--suite-timeout",
+        type=float,
+        help="Overall deadline in seconds; unfinished tests are then stopped "
+        "and reported as interrupted",
+        default=None,
+    )
+    parser.add_argument(
+        "--preflight",
+        action=argparse.BooleanOptionalAction,
+        help="Render every prompt, check the API key and the URLs before "
+        "launching any session",
+        default=True,
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Record Devin API latencies, status codes and retries per endpoint "
+        "and event loop stalls, and dump them at the end of the run",
+    )
+    parser.add_argument(
+        "--stall-threshold",
+        type=float,
+        help="With --profile, flag event loop stalls longer than this (seconds)",
+        default=0.1,
+    )
+    parser.add_argument(
+        "--results-file",
+        type=str,
+        help="Write the results of this run to this JSON file",
+        default=None,
+    )
     args = parser.parse_args()
-
-    test_names = args.tests.split(",") if args.tests else None
-    await run_tests_and_send_to_slack(
-        url=args.url,
-        test_names=test_names,
-        external_api_specs_url=args.external_api_specs_url,
-        sample_pdf_url=args.sample_pdf_url,
-        johndoejunior_zip_url=args.johndoejunior_zip_url,
+    shard = parse_shard(args.shard) if args.shard else None
+    results_file = args.results_file
+    if shard and not results_file:
+        results_file = f"qa_results_shard_{shard[0]}_of_{shard[1]}.json"
+    metrics_file = args.metrics_file or (
+        f"qa_metrics_shard_{shard[0]}_of_{shard[1]}.json"
+        if shard
+        else "qa_metrics.json"
     )
 
+    if args.resume:
+        journal = RunJournal.for_run(args.resume, args.journal_dir)
+        if not journal.run_options:
+            raise ValueError(f"No journal found for run {args.resume}")
+        # Prompts must be rendered exactly as in the interrupted run
+        run_options = journal.run_options
+    else:
+        journal = RunJournal.for_run(new_run_id(), args.journal_dir)
+        run_options = {
+            "url": args.url,
+            "test_names": args.tests.split(",") if args.tests else None,
+            "tags": args.tags.split(",") if args.tags else None,
+            "exclude_tags": args.exclude_tags.split(",") if args.exclude_tags else None,
+            "external_api_specs_url": args.external_api_specs_url,
+            "sample_pdf_url": args.sample_pdf_url,
+            "johndoejunior_zip_url": args.johndoejunior_zip_url,
+        }
+        journal.record_run_started(run_options)
+    print(f"Run ID: {journal.run_id} (resume with --resume {journal.run_id})")
+    metrics = RunMetrics(journal.run_id)
+    if args.profile:
+        request_stats = RequestStats()
+        devin_api_client.add_request_hook(request_stats)
+        loop_monitor = LoopLagMonitor(threshold=args.stall_threshold)
+        loop_monitor.start()
+
+    # The first SIGINT/SIGTERM winds the run down; a second one exits at once
+    interrupt = asyncio.Event()
+    loop = asyncio.get_running_loop()
+
+    def request_interrupt(sig: signal.Signals) -> None:
+        print(f"Received {sig.name}, winding down (repeat to exit immediately)")
+        interrupt.set()
+        loop.remove_signal_handler(sig)
+
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, request_interrupt, sig)
+
+    async with devin_api_client:
+        try:
+            results = await run_tests_and_send_to_slack(
+                **run_options,
+                journal=journal,
+                metrics=metrics,
+                preflight=args.preflight,
+                interrupt=interrupt,
+                suite_timeout=args.suite_timeout,
+                max_concurrent_launches=args.max_concurrent_launches,
+                launch_rate=args.launch_rate,
+                poll_interval=args.poll_interval,
+                max_concurrent_polls=args.max_concurrent_polls,
+                min_poll_interval=args.min_poll_interval,
+                max_poll_interval=args.max_poll_interval,
+                durations_file=args.durations_file,
+                finish_on_structured_output=args.finish_on_structured_output,
+                stop_finished_sessions=args.stop_finished_sessions,
+                batch_size=args.batch_size,
+                max_concurrent_sessions=args.max_concurrent_sessions,
+                shard=shard,
+                report_to_slack=shard is None,
+                default_session_options=build_session_options(
+                    args.snapshot_id, args.playbook_id, None
+                ),
+            )
+        except PreflightError as e:
+            print(e)
+            sys.exit(1)
+
+    if interrupt.is_set() and not results_file:
+        results_file = "qa_results.json"
+    if results_file:
+        write_results(
+            results_file,
+            results,
+            run_id=journal.run_id,
+            shard=args.shard,
+            # Lets the merge find the tests of shards that wrote no results
+            test_names=run_options["test_names"],
+            tags=run_options["tags"],
+            exclude_tags=run_options["exclude_tags"],
+            command=f"python3 {' '.join(sys.argv)}",
+            interrupted=interrupt.is_set(),
+        )
+        print(f"Results written to {results_file}")
+    if args.profile:
+        await loop_monitor.stop()
+        profile = {
+            "requests": request_stats.report(),
+            "event_loop": loop_monitor.report(),
+        }
+        profile_file = (
+            f"qa_profile_shard_{shard[0]}_of_{shard[1]}.json"
+            if shard
+            else "qa_profile.json"
+        )
+        with open(profile_file, "w") as f:
+            json.dump(profile, f, indent=2)
+        print(json.dumps(profile, indent=2))
+        print(f"Profile written to {profile_file}")
+    metrics.write_json(metrics_file)
+    print(f"Metrics written to {metrics_file}")
+    if args.prometheus_file:
+        metrics.write_prometheus(args.prometheus_file)
+    if interrupt.is_set():
+        sys.exit(130)
+
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,163 @@
+import asyncio
+import heapq
+import itertools
+
+
+class SessionSlots:
+    """Admits sessions under a max-concurrent-sessions quota.
+
+    Waiters are admitted highest `priority` first; with the expected duration
+    as priority this is longest-processing-time-first scheduling, which keeps
+    long tests off the tail of the run. Admission is decided on the next loop
+    iteration, so tests that ask for a slot at the same time compete by
+    priority rather than by arrival order. `max_sessions=None` means no quota.
+    """
+
+    def __init__(self, max_sessions: int | None = None):
+        self.max_sessions = max_sessions
+        self.in_use = 0
+        self._waiters: list[tuple[float, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+        self._dispatch_scheduled = False
+
+    async def acquire(self, priority: float = 0) -> None:
+        if self.max_sessions is None:
+            self.in_use += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (-priority, next(self._counter), future))
+        self._schedule_dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted just before being cancelled; give the slot back
+                self.release()
+            raise
+
+    def release(self) -> None:
+        self.in_use -= 1
+        if self.max_sessions is not None:
+            self._schedule_dispatch()
+
+    def _schedule_dispatch(self) -> None:
+        if not self._dispatch_scheduled:
+            self._dispatch_scheduled = True
+            asyncio.get_running_loop().call_soon(self._dispatch)
+
+    def _dispatch(self) -> None:
+        self._dispatch_scheduled = False
+        while self._waiters and self.in_use < self.max_sessions:
+            _, _, future = heapq.heappop(self._waiters)
+            if future.cancelled():
+                continue
+            self.in_use += 1
+            future.set_result(None)
+
+
+class ResourceLocks:
+    """Read/write locks on shared resources that tests declare.
+
+    Tests that only read a resource share it, a test that writes it has it to
+    itself. All locks of a test are taken at once, so tests cannot deadlock
+    each other. Waiters are admitted highest `priority` first, and a waiter
+    never overtakes a higher priority waiter it conflicts with, so a stream
+    of readers cannot starve a writer.
+    """
+
+    def __init__(self):
+        self._readers: dict[str, int] = {}
+        self._writers: set[str] = set()
+        self._waiters: list[
+            tuple[float, int, frozenset[str], frozenset[str], asyncio.Future]
+        ] = []
+        self._counter = itertools.count()
+        self._dispatch_scheduled = False
+
+    async def acquire(
+        self, reads: list[str], writes: list[str], priority: float = 0
+    ) -> None:
+        write_set = frozenset(writes)
+        read_set = frozenset(reads) - write_set
+        if not read_set and not write_set:
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(
+            self._waiters,
+            (-priority, next(self._counter), read_set, write_set, future),
+        )
+        self._schedule_dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just before being cancelled; give the locks back
+                self.release(reads, writes)
+            raise
+
+    def release(self, reads: list[str], writes: list[str]) -> None:
+        for resource in set(reads) - set(writes):
+            self._readers[resource] -= 1
+            if not self._readers[resource]:
+                del self._readers[resource]
+        self._writers.difference_update(writes)
+        if reads or writes:
+            self._schedule_dispatch()
+
+    def _schedule_dispatch(self) -> None:
+        if not self._dispatch_scheduled:
+            self._dispatch_scheduled = True
+            asyncio.get_running_loop().call_soon(self._dispatch)
+
+    def _dispatch(self) -> None:
+        self._dispatch_scheduled = False
+        # Resources wanted by higher priority waiters that are still waiting
+        claimed_reads: set[str] = set()
+        claimed_writes: set[str] = set()
+        still_waiting = []
+        for waiter in sorted(self._waiters):
+            _, _, reads, writes, future = waiter
+            if future.cancelled():
+                continue
+            if (reads | writes).isdisjoint(self._writers | claimed_writes) and (
+                writes.isdisjoint(self._readers.keys() | claimed_reads)
+            ):
+                for resource in reads:
+                    self._readers[resource] = self._readers.get(resource, 0) + 1
+                self._writers.update(writes)
+                future.set_result(None)
+            else:
+                claimed_reads.update(reads)
+                claimed_writes.update(writes)
+                still_waiting.append(waiter)
+        # A sorted list is a valid heap
+        self._waiters = still_waiting
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """Parse "i/n" (1-based) into (i, n)."""
+    index, count = (int(part) for part in value.split("/"))
+    if not 1 <= index <= count:
+        raise ValueError(f"Invalid shard {value}, expected i/n with 1 <= i <= n")
+    return index, count
+
+
+def shard_by_duration(
+    test_names: list[str], expected_durations: dict[str, float], count: int
+) -> list[list[str]]:
+    """Split tests into `count` shards with balanced total expected duration.
+
+    Greedy longest-first: each test goes to the currently shortest shard. The
+    result only depends on the inputs, so every shard job computes the same
+    split. Tests keep their original order within a shard.
+    """
+    shards: list[list[str]] = [[] for _ in range(count)]
+    totals = [0.0] * count
+    for test_name in sorted(
+        test_names, key=lambda name: (-expected_durations[name], name)
+    ):
+        shortest = min(range(count), key=lambda i: (totals[i], i))
+        shards[shortest].append(test_name)
+        totals[shortest] += expected_durations[test_name]
+    order = {test_name: i for i, test_name in enumerate(test_names)}
+    return [sorted(shard, key=order.__getitem__) for shard in shards]
@@ -0,0 +1,317 @@
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from devin_api_client import (
+    DevinAPIClient,
+    DevinAPIClientPool,
+    DevinAPISessionStatusResponse,
+)
+
+TERMINAL_STATUS_ENUMS = ["blocked", "stopped"]
+
+
+def is_terminal(status: DevinAPISessionStatusResponse | None) -> bool:
+    return bool(
+        status
+        and status["status_enum"] is not None
+        and status["status_enum"].lower() in TERMINAL_STATUS_ENUMS
+    )
+
+
+def has_final_structured_output(
+    status: DevinAPISessionStatusResponse | None,
+    previous_status: DevinAPISessionStatusResponse | None,
+    test_name: str | None = None,
+) -> bool:
+    """Whether the session has delivered its verdict.
+
+    The structured output must have a boolean `success` and a non-empty
+    `message`, and must be unchanged since the previous poll so that an
+    output Devin is still writing is not mistaken for the final one. If
+    `test_name` is given, the output must also be for that test.
+    """
+    if not status or not previous_status:
+        return False
+    output = status.get("structured_output")
+    return (
+        isinstance(output, dict)
+        and isinstance(output.get("success"), bool)
+        and isinstance(output.get("message"), str)
+        and bool(output["message"])
+        and output == previous_status.get("structured_output")
+        and (test_name is None or output.get("test_name") == test_name)
+    )
+
+
+@dataclass
+class WatchedSession:
+    session_id: str
+    deadline: float
+    future: asyncio.Future
+    started_at: float
+    interval: float
+    expected_duration: float | None = None
+    # Set for batched tests, whose verdict is tagged with their name
+    output_test_name: str | None = None
+    # Set for tests sent to a session that already ran other tests
+    follow_up: bool = False
+    seen_working: bool = False
+    # Set to wait for a session to go idle, ignoring its structured output
+    until_idle: bool = False
+    last_status: DevinAPISessionStatusResponse | None = None
+    polls: int = 0
+    max_polls: int | None = None
+
+
+class SessionPoller:
+    """Polls the status of every active session from one scheduler task.
+
+    Each session gets a due time in a heap. New sessions are spread randomly
+    over the first poll interval and every later poll is rescheduled with
+    jitter, so requests stay evenly spread instead of landing in bursts.
+    `watch` returns a future that resolves with the last seen status once the
+    session reaches a terminal state, delivers a final structured output
+    (if `complete_on_structured_output` is set), or its deadline or poll
+    budget runs out.
+
+    The interval per session is adaptive: it drops to `min_interval` right
+    after a status or structured output change, backs off towards
+    `max_interval` while the session keeps working, and tightens again as the
+    session nears its expected (historical median) duration.
+    """
+
+    def __init__(
+        self,
+        client: DevinAPIClient | DevinAPIClientPool,
+        poll_interval: float = 20,
+        max_in_flight: int = 10,
+        jitter: float = 0.1,
+        min_interval: float = 5,
+        max_interval: float = 60,
+        backoff: float = 1.5,
+        complete_on_structured_output: bool = True,
+        on_status_change: (
+            Callable[[str, DevinAPISessionStatusResponse | None], None] | None
+        ) = None,
+        on_poll: (
+            Callable[
+                [
+                    str,
+                    DevinAPISessionStatusResponse | None,
+                    DevinAPISessionStatusResponse | None,
+                    float,
+                ],
+                None,
+            ]
+            | None
+        ) = None,
+    ):
+        self.client = client
+        self.poll_interval = poll_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.complete_on_structured_output = complete_on_structured_output
+        self.on_status_change = on_status_change
+        self.on_poll = on_poll
+        self.jitter = jitter
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._sessions: dict[str, WatchedSession] = {}
+        self._heap: list[tuple[float, int, str]] = []
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._in_flight: set[asyncio.Task] = set()
+
+    async def __aenter__(self) -> "SessionPoller":
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for task in list(self._in_flight):
+            task.cancel()
+        await asyncio.gather(*self._in_flight, return_exceptions=True)
+        for watched in self._sessions.values():
+            if not watched.future.done():
+                watched.future.cancel()
+        self._sessions.clear()
+        self._heap.clear()
+
+    def watch(
+        self,
+        session_id: str,
+        max_duration: float,
+        expected_duration: float | None = None,
+        output_test_name: str | None = None,
+        max_polls: int | None = None,
+        follow_up: bool = False,
+        until_idle: bool = False,
+        elapsed: float = 0,
+    ) -> "asyncio.Future[DevinAPISessionStatusResponse | None]":
+        """Watch a session until it completes.
+
+        With `output_test_name` only a structured output for that test counts
+        as a verdict. For a `follow_up` test, sent to a session that already
+        ran another test, a terminal state only counts once the session has
+        been seen working again, so the state left behind by the earlier test
+        is not mistaken for this test's. With `until_idle` only a terminal
+        state counts, e.g. to wait for a session to finish its previous test
+        before it is sent a follow-up. `elapsed` is how long the session has
+        already been running, e.g. when reattaching to it, and counts towards
+        its `expected_duration`.
+        """
+        now = time.monotonic()
+        watched = WatchedSession(
+            session_id=session_id,
+            deadline=now + max_duration,
+            future=asyncio.get_running_loop().create_future(),
+            started_at=now - elapsed,
+            interval=self.poll_interval,
+            expected_duration=expected_duration,
+            output_test_name=output_test_name,
+            max_polls=max_polls,
+            follow_up=follow_up,
+            until_idle=until_idle,
+        )
+        self._sessions[session_id] = watched
+        self._schedule(session_id, now + random.uniform(0, self.poll_interval))
+        return watched.future
+
+    def _schedule(self, session_id: str, due: float) -> None:
+        heapq.heappush(self._heap, (due, next(self._counter), session_id))
+        self._wakeup.set()
+
+    def _next_poll_delay(
+        self,
+        watched: WatchedSession,
+        previous_status: DevinAPISessionStatusResponse | None,
+    ) -> float:
+        status = watched.last_status
+        status_enum = status["status_enum"] if status else None
+        previous_status_enum = (
+            previous_status["status_enum"] if previous_status else None
+        )
+        output = status["structured_output"] if status else None
+        previous_output = (
+            previous_status["structured_output"] if previous_status else None
+        )
+        if status_enum != previous_status_enum or output != previous_output:
+            watched.interval = self.min_interval
+        elif status_enum == "working":
+            watched.interval = min(watched.interval * self.backoff, self.max_interval)
+        interval = watched.interval
+
+        now = time.monotonic()
+        if watched.expected_duration is not None:
+            remaining = watched.expected_duration - (now - watched.started_at)
+            if remaining > 0:
+                interval = min(interval, max(self.min_interval, remaining / 2))
+            else:
+                interval = min(interval, self.poll_interval)
+
+        interval *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        # Never sleep past the deadline, so timeouts are detected on time
+        return max(0.0, min(interval, watched.deadline - now))
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+            due, _, session_id = self._heap[0]
+            delay = due - time.monotonic()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(self._heap)
+            watched = self._sessions.get(session_id)
+            if watched is None or watched.future.done():
+                continue
+            await self._semaphore.acquire()
+            task = asyncio.create_task(self._poll(watched))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _poll(self, watched: WatchedSession) -> None:
+        started = time.monotonic()
+        try:
+            status = await self.client.get_session_status(watched.session_id)
+        except Exception as e:
+            self._resolve(watched, exception=e)
+            return
+        finally:
+            self._semaphore.release()
+        try:
+            self._process(watched, status, time.monotonic() - started)
+        except Exception as e:
+            # A failing hook or malformed status must not leave the watch hanging
+            self._resolve(watched, exception=e)
+
+    def _process(
+        self,
+        watched: WatchedSession,
+        status: DevinAPISessionStatusResponse | None,
+        latency: float,
+    ) -> None:
+        previous_status = watched.last_status
+        watched.polls += 1
+        watched.last_status = status
+        if self.on_poll:
+            self.on_poll(watched.session_id, status, previous_status, latency)
+        if self.on_status_change and (
+            watched.polls == 1
+            or (status or {}).get("status_enum")
+            != (previous_status or {}).get("status_enum")
+        ):
+            self.on_status_change(watched.session_id, status)
+        if status and status["status_enum"] == "working":
+            watched.seen_working = True
+        if (
+            (is_terminal(status) and (not watched.follow_up or watched.seen_working))
+            or (
+                not watched.until_idle
+                and (self.complete_on_structured_output or watched.output_test_name)
+                and has_final_structured_output(
+                    status, previous_status, watched.output_test_name
+                )
+            )
+            or time.monotonic() >= watched.deadline
+            or (watched.max_polls is not None and watched.polls >= watched.max_polls)
+        ):
+            self._resolve(watched)
+        else:
+            self._schedule(
+                watched.session_id,
+                time.monotonic() + self._next_poll_delay(watched, previous_status),
+            )
+
+    def _resolve(
+        self, watched: WatchedSession, exception: BaseException | None = None
+    ) -> None:
+        self._sessions.pop(watched.session_id, None)
+        if watched.future.done():
+            return
+        if exception is not None:
+            watched.future.set_exception(exception)
+        else:
+            watched.future.set_result(watched.last_status)
@@ -0,0 +1,218 @@
+import asyncio
+import time
+
+from slack_sdk.web.async_client import AsyncWebClient
+
+from qa_results import QATestResult
+
+# Slack allows roughly one chat.update per second per message; stay well below
+MIN_SUMMARY_UPDATE_INTERVAL = 5
+
+# Slack Block Kit limits: blocks per message and characters per section text
+SLACK_MAX_BLOCKS_PER_MESSAGE = 50
+SLACK_MAX_SECTION_TEXT = 3000
+# Keep each message comfortably below Slack's payload limits
+SLACK_MAX_MESSAGE_CHARS = 12000
+# Longer result messages are cut and link to the full session instead
+MAX_RESULT_MESSAGE_CHARS = 1500
+
+
+def format_result_details(
+    result: QATestResult, max_message_chars: int | None = None
+) -> str:
+    test_link = result["test_name"]
+    if result["session_url"]:
+        test_link = f"<{result['session_url']}|{result['test_name']}>"
+    details = f"Detailed results for {test_link}:\n"
+    details += f"Status: {result['status_enum']}\n"
+    message = result["message"]
+    if max_message_chars is not None and len(message) > max_message_chars:
+        message = (
+            message[:max_message_chars]
+            + f"… <{result['session_url']}|see the full output>"
+        )
+    if message:
+        details += f"Message: {message}\n"
+    return details
+
+
+def format_result_block(result: QATestResult) -> dict:
+    emoji = "✅" if result["success"] else "❌"
+    text = f"{emoji} " + format_result_details(result, MAX_RESULT_MESSAGE_CHARS)
+    return {
+        "type": "section",
+        "text": {"type": "mrkdwn", "text": text[:SLACK_MAX_SECTION_TEXT]},
+    }
+
+
+def chunk_blocks(blocks: list[dict]) -> list[list[dict]]:
+    """Split blocks into as few messages as Slack's size limits allow."""
+    chunks: list[list[dict]] = []
+    chunk: list[dict] = []
+    chunk_chars = 0
+    for block in blocks:
+        block_chars = len(block["text"]["text"])
+        if chunk and (
+            len(chunk) >= SLACK_MAX_BLOCKS_PER_MESSAGE
+            or chunk_chars + block_chars > SLACK_MAX_MESSAGE_CHARS
+        ):
+            chunks.append(chunk)
+            chunk, chunk_chars = [], 0
+        chunk.append(block)
+        chunk_chars += block_chars
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+class SlackReporter:
+    """Reports results to Slack while the run is still going.
+
+    `start` posts a summary message listing every test as running; session
+    links are added as sessions start (`set_session_url`). Results
+    passed to `report` are buffered and flushed at most once every
+    `min_update_interval` seconds: the buffered details are packed into as
+    few Block Kit thread replies as possible and the summary is updated.
+    Flushes never overlap, and `finish` waits for one already in flight
+    before flushing whatever is left. Without a client everything is only
+    printed.
+    """
+
+    def __init__(
+        self,
+        client: AsyncWebClient | None,
+        channel: str,
+        command: str,
+        max_concurrent_posts: int = 4,
+        min_update_interval: float = MIN_SUMMARY_UPDATE_INTERVAL,
+    ):
+        self.client = client
+        self.channel = channel
+        self.command = command
+        self.min_update_interval = min_update_interval
+        self._semaphore = asyncio.Semaphore(max_concurrent_posts)
+        self._test_names: list[str] = []
+        self._session_urls: dict[str, str] = {}
+        self._results: dict[str, QATestResult] = {}
+        self._pending_details: list[QATestResult] = []
+        self._thread_ts: str | None = None
+        self._last_update_at = 0.0
+        self._flush_task: asyncio.Task | None = None
+        # Whether the flush task is past its delay and sending to Slack
+        self._flushing = False
+        # Whether anything changed since the last flush started
+        self._dirty = False
+        self._finishing = False
+        self._interrupted = False
+
+    def format_summary(self) -> str:
+        done = len(self._results)
+        total = len(self._test_names)
+        summary = "*QA Test Results*"
+        if self._interrupted:
+            summary += f" (interrupted, {done}/{total} done)"
+        elif done < total:
+            summary += f" (running, {done}/{total} done)"
+        summary += f"\n*Command*: `{self.command}`\n"
+        summary += "-" * 100 + "\n"
+        for test_name in self._test_names:
+            result = self._results.get(test_name)
+            if result is None:
+                emoji = "⏹️" if self._interrupted else "⏳"
+            else:
+                emoji = "✅" if result["success"] else "❌"
+            session_url = self._session_urls.get(test_name)
+            if session_url:
+                summary += f"{emoji} *<{session_url}|{test_name}>*\n"
+            else:
+                summary += f"{emoji} *{test_name}*\n"
+        return summary
+
+    async def start(self, test_names: list[str]) -> None:
+        self._test_names = test_names
+        summary = self.format_summary()
+        print(summary)
+        if self.client:
+            main_message = await self.client.chat_postMessage(
+                channel=self.channel, text=summary
+            )
+            self._thread_ts = main_message["ts"]
+            # chat.update needs the channel ID, not the name we may have posted to
+            self.channel = main_message["channel"]
+            self._last_update_at = time.monotonic()
+
+    def set_session_url(self, test_name: str, session_url: str) -> None:
+        self._session_urls[test_name] = session_url
+        self._dirty = True
+        self._schedule_flush()
+
+    async def report(self, result: QATestResult) -> None:
+        self._results[result["test_name"]] = result
+        if result["session_url"]:
+            self._session_urls[result["test_name"]] = result["session_url"]
+        print(format_result_details(result))
+        self._pending_details.append(result)
+        self._dirty = True
+        self._schedule_flush()
+
+    def _schedule_flush(self) -> None:
+        if self.client and self._thread_ts and self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def finish(self, interrupted: bool = False) -> None:
+        """Post the final summary; `interrupted` marks unfinished tests."""
+        self._interrupted = interrupted
+        self._finishing = True
+        while self._flush_task is not None:
+            task = self._flush_task
+            if not self._flushing:
+                # Still waiting out its delay; the final flush below covers it
+                task.cancel()
+            # A flush in flight must land before the final summary
+            await asyncio.gather(task, return_exceptions=True)
+        print(self.format_summary())
+        if self.client and self._thread_ts:
+            try:
+                await self._flush()
+            except Exception as e:
+                # The run's results still get written even if Slack fails
+                print(f"Failed to report results to Slack: {e}")
+
+    async def _flush_later(self) -> None:
+        # The handle is kept until the flush is done, so flushes never overlap
+        try:
+            delay = self._last_update_at + self.min_update_interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._flushing = True
+            try:
+                await self._flush()
+            except Exception as e:
+                print(f"Failed to report results to Slack: {e}")
+        finally:
+            self._flushing = False
+            self._flush_task = None
+        # Report what changed while the flush was in flight
+        if self._dirty and not self._finishing:
+            self._schedule_flush()
+
+    async def _flush(self) -> None:
+        self._last_update_at = time.monotonic()
+        self._dirty = False
+        pending, self._pending_details = self._pending_details, []
+        blocks = [format_result_block(result) for result in pending]
+        await asyncio.gather(
+            *(self._post_details(chunk) for chunk in chunk_blocks(blocks)),
+            self.client.chat_update(
+                channel=self.channel, ts=self._thread_ts, text=self.format_summary()
+            ),
+        )
+
+    async def _post_details(self, blocks: list[dict]) -> None:
+        async with self._semaphore:
+            await self.client.chat_postMessage(
+                channel=self.channel,
+                thread_ts=self._thread_ts,
+                text=f"Detailed results for {len(blocks)} tests",
+                blocks=blocks,
+            )
@@ -0,0 +1,109 @@
+import asyncio
+
+from scheduler import ResourceLocks
+
+
+async def granted(task: asyncio.Task) -> bool:
+    # Let the scheduled dispatch and the granted waiter run
+    for _ in range(3):
+        await asyncio.sleep(0)
+    return task.done()
+
+
+def test_readers_share_and_writer_is_exclusive():
+    async def run():
+        locks = ResourceLocks()
+        await locks.acquire(["case"], [])
+        reader = asyncio.create_task(locks.acquire(["case"], []))
+        assert await granted(reader)
+        writer = asyncio.create_task(locks.acquire([], ["case"]))
+        assert not await granted(writer)
+        locks.release(["case"], [])
+        assert not await granted(writer)
+        locks.release(["case"], [])
+        assert await granted(writer)
+
+    asyncio.run(run())
+
+
+def test_waiters_are_admitted_by_priority():
+    async def run():
+        locks = ResourceLocks()
+        order = []
+
+        async def write(priority: float):
+            await locks.acquire([], ["case"], priority)
+            order.append(priority)
+            locks.release([], ["case"])
+
+        await locks.acquire([], ["case"])
+        tasks = [asyncio.create_task(write(priority)) for priority in (1, 3, 2)]
+        await asyncio.sleep(0)
+        locks.release([], ["case"])
+        await asyncio.gather(*tasks)
+        assert order == [3, 2, 1]
+
+    asyncio.run(run())
+
+
+def test_later_readers_do_not_starve_a_waiting_writer():
+    async def run():
+        locks = ResourceLocks()
+        await locks.acquire(["case"], [])
+        writer = asyncio.create_task(locks.acquire([], ["case"]))
+        assert not await granted(writer)
+        reader = asyncio.create_task(locks.acquire(["case"], []))
+        assert not await granted(reader)
+        locks.release(["case"], [])
+        assert await granted(writer)
+        assert not await granted(reader)
+        locks.release([], ["case"])
+        assert await granted(reader)
+
+    asyncio.run(run())
+
+
+def test_waiter_does_not_block_unrelated_resources():
+    async def run():
+        locks = ResourceLocks()
+        await locks.acquire([], ["case"])
+        blocked = asyncio.create_task(locks.acquire([], ["case"], priority=10))
+        other = asyncio.create_task(locks.acquire(["account"], ["versions"]))
+        assert await granted(other)
+        assert not await granted(blocked)
+        blocked.cancel()
+
+    asyncio.run(run())
+
+
+def test_cancelled_after_grant_releases_locks():
+    async def run():
+        locks = ResourceLocks()
+        await locks.acquire(["account"], ["case"])
+        waiter = asyncio.create_task(locks.acquire(["account"], ["case"]))
+        await asyncio.sleep(0)
+        locks.release(["account"], ["case"])
+        # Grant the waiter, then cancel it before it gets to run
+        locks._dispatch()
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert waiter.cancelled()
+        assert locks._readers == {} and locks._writers == set()
+        await asyncio.wait_for(locks.acquire([], ["case", "account"]), timeout=1)
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_is_skipped():
+    async def run():
+        locks = ResourceLocks()
+        await locks.acquire([], ["case"])
+        cancelled = asyncio.create_task(locks.acquire([], ["case"], priority=10))
+        waiter = asyncio.create_task(locks.acquire([], ["case"]))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.gather(cancelled, return_exceptions=True)
+        locks.release([], ["case"])
+        assert await granted(waiter)
+
+    asyncio.run(run())
@@ -1,9 +1,44 @@
-from typing import TypedDict
+import fnmatch
+import functools
+from typing import Callable, TypedDict
+
+from devin_api_client import DevinAPISessionOptions
 
 
 class QATest(TypedDict):
     test_name: str
+    # Builds the prompt on first use, so unselected tests cost nothing
+    load_prompt: Callable[[], str]
+    # Labels for selecting tests, e.g. "doclist" or "smoke"
+    tags: list[str]
+    # Name of a QAFixture whose outputs are formatted into user_prompt
+    fixture: str | None
+    # Have the fixture prepare a separate copy for this test, for tests that
+    # change what it prepares; otherwise tests share what it prepares
+    own_fixture: bool
+    # Session creation options, e.g. a snapshot_id with the app already set up
+    session_options: DevinAPISessionOptions
+    # Wall-clock limit in seconds after which the session is stopped
+    # (None for the runner's MAX_TIME_PER_TEST)
+    max_duration: float | None
+    # Max session status polls before the session is stopped (None for no limit);
+    # only a fallback, the session's cost is capped by its max_acu_limit
+    max_polls: int | None
+    # Shared resources (e.g. a fixture's case) the test only reads or changes;
+    # tests that write a resource never run at the same time as its other users
+    reads: list[str]
+    writes: list[str]
+
+
+class QAFixture(TypedDict):
+    fixture_name: str
     user_prompt: str
+    # Keys of the fixture's structured output that dependent tests can use
+    outputs: list[str]
+    session_options: DevinAPISessionOptions
+    # Shared resources the fixture's session uses, like a QATest's
+    reads: list[str]
+    writes: list[str]
 
 
 QA_PREAMBLE = f"""\
@@ -31,6 +66,30 @@ DOCLIST_TEST_SETUP = f"""\
 - Click "Launch Sky" button
 """
 
+# Prepended to every test prompt when several tests share one session
+BATCHED_TEST_INSTRUCTIONS = """\
+You will run several QA tests one after another in this session, each sent as a new message. This message is the test "{test_name}". If you are already logged in from a previous test, stay logged in and skip the login steps.
+When you are done with this test, replace the structured output with a JSON object with 'test_name' set to "{test_name}", 'success' (boolean) and 'message' (string), then wait for the next message.
+
+"""
+
+# The list of cases of the DEV_USER_EMAIL account that all tests log into, for
+# `reads` and `writes`: creating or archiving a case writes it, picking "another
+# case" from it reads it
+DEV_USER_CASES = "dev-user-cases"
+
+# Name of the fixture that prepares the doclist tests' cases in one session.
+# Tests that only read the case share one; tests that change it get their own.
+DOCLIST_CASE_FIXTURE = "doclist-case"
+
+DOCLIST_FIXTURE_SETUP = f"""\
+## Test Setup Requirements
+- A case with ID {{case_id}} was already created through the External API and its files were uploaded and processed. Do not create a new case.
+- Log in to the app.
+- Open the case with ID {{case_id}} in the app.
+- Click "Launch Sky" button
+"""
+
 # Common CHECK patterns
 CHECK_PERSISTENCE = "CHECK persistence after page refresh"
 CHECK_ORDER_PERSISTS = "CHECK order persists after refresh"
@@ -48,18 +107,161 @@ MODAL_DUAL_PANE_CHECKS = """\
 """
 
 
-def create_qa_test(test_name: str, user_prompt: str) -> QATest:
-    user_prompt = QA_PREAMBLE + "\n\n" + user_prompt
+def build_session_options(
+    snapshot_id: str | None,
+    playbook_id: str | None,
+    session_options: DevinAPISessionOptions | None,
+) -> DevinAPISessionOptions:
+    options: DevinAPISessionOptions = {**(session_options or {})}
+    if snapshot_id:
+        options["snapshot_id"] = snapshot_id
+    if playbook_id:
+        options["playbook_id"] = playbook_id
+    return options
+
+
+def create_qa_test(
+    test_name: str,
+    user_prompt: str | Callable[[], str],
+    fixture: str | None = None,
+    own_fixture: bool = False,
+    snapshot_id: str | None = None,
+    playbook_id: str | None = None,
+    session_options: DevinAPISessionOptions | None = None,
+    include_preamble: bool = True,
+    max_duration: float | None = None,
+    max_acu_limit: int | None = None,
+    max_polls: int | None = None,
+    tags: list[str] | None = None,
+    reads: list[str] | None = None,
+    writes: list[str] | None = None,
+) -> QATest:
+    """Create a test.
+
+    Tests that modify what their `fixture` prepares must set
+    `own_fixture=True`, so they never see each other's changes.
+
+    Set `include_preamble=False` when the playbook already contains
+    QA_PREAMBLE, so it is not sent twice. `max_duration` bounds how long the
+    test may take before its session is stopped, and `max_acu_limit` caps how
+    many ACUs its session may spend (sent as the session's `max_acu_limit`).
+    `max_polls` is a fallback limit on status polls. `user_prompt` may be a
+    function, called the first time the prompt is needed. `reads` and `writes` name the shared resources the test
+    uses, so that conflicting tests are run one after another.
+    """
+
+    @functools.cache
+    def load_prompt() -> str:
+        prompt = user_prompt() if callable(user_prompt) else user_prompt
+        if include_preamble:
+            prompt = QA_PREAMBLE + "\n\n" + prompt
+        return prompt
+
+    options = build_session_options(snapshot_id, playbook_id, session_options)
+    if max_acu_limit is not None:
+        options["max_acu_limit"] = max_acu_limit
+
     return {
         "test_name": test_name,
+        "load_prompt": load_prompt,
+        "tags": tags or [],
+        "fixture": fixture,
+        "own_fixture": own_fixture,
+        "session_options": options,
+        "max_duration": max_duration,
+        "max_polls": max_polls,
+        "reads": reads or [],
+        "writes": writes or [],
+    }
+
+
+def create_qa_fixture(
+    fixture_name: str,
+    user_prompt: str,
+    outputs: list[str],
+    snapshot_id: str | None = None,
+    playbook_id: str | None = None,
+    session_options: DevinAPISessionOptions | None = None,
+    include_preamble: bool = True,
+    reads: list[str] | None = None,
+    writes: list[str] | None = None,
+) -> QAFixture:
+    output_keys = ", ".join(f"'{output}' (string)" for output in outputs)
+    if include_preamble:
+        user_prompt = QA_PREAMBLE + "\n\n" + user_prompt
+    user_prompt += f"\nIn the structured output JSON also include {output_keys}.\n"
+    return {
+        "fixture_name": fixture_name,
         "user_prompt": user_prompt,
+        "outputs": outputs,
+        "session_options": build_session_options(
+            snapshot_id, playbook_id, session_options
+        ),
+        "reads": reads or [],
+        "writes": writes or [],
     }
 
 
+def fixture_copy_output(key: str, test_name: str) -> str:
+    """Output key of the copy a fixture prepares for one `own_fixture` test."""
+    return f"{key}_{test_name}"
+
+
+def fixture_copies_prompt(fixture: QAFixture, test_names: list[str]) -> str:
+    """Asks a fixture to also prepare a separate copy for each of `test_names`.
+
+    All copies are prepared in the fixture's one session, so slow steps like
+    waiting for processing overlap instead of running once per test.
+    """
+    output_keys = ", ".join(
+        f"'{fixture_copy_output(key, test_name)}' (string)"
+        for test_name in test_names
+        for key in fixture["outputs"]
+    )
+    return (
+        f"\nAlso prepare {len(test_names)} more separate copies of the above, one "
+        f"for each of these tests that will change it: {', '.join(test_names)}. "
+        "Repeat the setup for every copy, but start the slow steps (uploads, "
+        "waiting for processing) for all copies at the same time instead of one "
+        "after another. Do not reuse anything between copies.\n"
+        f"In the structured output JSON also include {output_keys}, each set to "
+        "the value of that test's own copy.\n"
+    )
+
+
+# Fixtures run once per run, before any test that depends on them
+QA_FIXTURES: list[QAFixture] = [
+    create_qa_fixture(
+        fixture_name=DOCLIST_CASE_FIXTURE,
+        user_prompt=f"""
+## Objective
+Prepare a case with processed documents that other tests will use. Do not change the case once it is ready.
+
+## Login Instructions
+{DEVIN_QA_LOGIN_INSTRUCTIONS}
+
+## Setup
+- Download the zip archive from {{johndoejunior_zip_url}}, extract it
+- Take the bearer token from SKY_API_KEY_DEV secret and use it to authenticate with the External API: {{external_api_specs_url}}.
+- Create a new case using the External API: {{external_api_specs_url}}.
+- Upload files to the case using the External API: {{external_api_specs_url}}.
+- Keep making requests to chat-status for this case in 30 second intervals and CHECK: the chat status is "COMPLETE". Timeout is 15 minutes.
+- Log in to the app.
+- Open the case in the app.
+- CHECK: The case opens and shows the uploaded documents.
+- Put the ID of the case you created in 'case_id'.
+        """,
+        outputs=["case_id"],
+        writes=[DEV_USER_CASES],
+    ),
+]
+
+
 QA_TESTS: list[QATest] = [
     create_qa_test(
         test_name="test-external-api",
-        user_prompt=f"""
+        tags=["api", "smoke"],
+        user_prompt=lambda: f"""
 You should test Sky External API: {{external_api_specs_url}}
 Take the bearer token from SKY_API_KEY_DEV secret and use it to authenticate with the API.
 You need to:
@@ -72,17 +274,22 @@ You need to:
 - After the chat status is "COMPLETE", archive the case using the API.
 - CHECK: You don't see the case in the list anymore.
         """,
+        # Includes a 10 minute chat status wait; anything beyond that is stuck
+        max_duration=15 * 60,
+        # Creates and archives a case
+        writes=[DEV_USER_CASES],
     ),
     create_qa_test(
         test_name="test-doclist-section-ops",
-        user_prompt=f"""
+        tags=["doclist"],
+        user_prompt=lambda: f"""
 ## Objective
 Test all section operations in the document list including rename, move, split, merge, and delete.
 
 ## Login Instructions
 {DEVIN_QA_LOGIN_INSTRUCTIONS}
 
-{DOCLIST_TEST_SETUP}
+{DOCLIST_FIXTURE_SETUP}
 
 ---
 
@@ -143,17 +350,20 @@ Test all section operations in the document list including rename, move, split,
   - CHECK deletion persists after refresh
 - CHECK "Delete" is disabled when only one section exists in fallback category
         """,
+        fixture=DOCLIST_CASE_FIXTURE,
+        own_fixture=True,
     ),
     create_qa_test(
         test_name="test-doclist-category-ops",
-        user_prompt=f"""
+        tags=["doclist"],
+        user_prompt=lambda: f"""
 ## Objective
 Test all category operations in the document list including rename, sort, merge all, delete, and create.
 
 ## Login Instructions
 {DEVIN_QA_LOGIN_INSTRUCTIONS}
 
-{DOCLIST_TEST_SETUP}
+{DOCLIST_FIXTURE_SETUP}
 
 ---
 
@@ -217,17 +427,20 @@ Test all category operations in the document list including rename, sort, merge
   - Category saves with Enter key
   - Appears in correct order
         """,
+        fixture=DOCLIST_CASE_FIXTURE,
+        own_fixture=True,
     ),
     create_qa_test(
         test_name="test-doclist-drag-drop",
-        user_prompt=f"""
+        tags=["doclist"],
+        user_prompt=lambda: f"""
 ## Objective
 Test all drag and drop functionality in the document list including reordering categories, sections, and pages.
 
 ## Login Instructions
 {DEVIN_QA_LOGIN_INSTRUCTIONS}
 
-{DOCLIST_TEST_SETUP}
+{DOCLIST_FIXTURE_SETUP}
 
 ---
 
@@ -286,17 +499,20 @@ Test all drag and drop functionality in the document list including reordering c
 - CHECK error handling for failed drag operations
 - Test drag on touch devices (mobile)
         """,
+        fixture=DOCLIST_CASE_FIXTURE,
+        own_fixture=True,
     ),
     create_qa_test(
         test_name="test-doclist-batch-ops",
-        user_prompt=f"""
+        tags=["doclist"],
+        user_prompt=lambda: f"""
 ## Objective
 Test batch operations and multi-select functionality in the document list.
 
 ## Login Instructions
 {DEVIN_QA_LOGIN_INSTRUCTIONS}
 
-{DOCLIST_TEST_SETUP}
+{DOCLIST_FIXTURE_SETUP}
 
 ---
 
@@ -348,17 +564,20 @@ Test batch operations and multi-select functionality in the document list.
   - Cannot delete if it would leave category empty (test edge case)
   - {CHECK_SELECTION_CLEARS} deletion
         """,
+        fixture=DOCLIST_CASE_FIXTURE,
+        own_fixture=True,
     ),
     create_qa_test(
         test_name="test-doclist-export",
-        user_prompt=f"""
+        tags=["doclist"],
+        user_prompt=lambda: f"""
 ## Objective
 Test export functionality in the document list including PDF export and table of contents.
 
 ## Login Instructions
 {DEVIN_QA_LOGIN_INSTRUCTIONS}
 
-{DOCLIST_TEST_SETUP}
+{DOCLIST_FIXTURE_SETUP}
 
 ---
 
@@ -408,17 +627,19 @@ Test export functionality in the document list including PDF export and table of
 - Test canceling export mid-process
 - Test multiple rapid export attempts
         """,
+        fixture=DOCLIST_CASE_FIXTURE,
     ),
     create_qa_test(
         test_name="test-doclist-search",
-        user_prompt=f"""
+        tags=["doclist"],
+        user_prompt=lambda: f"""
 ## Objective
 Test filter and search functionality in the document list.
 
 ## Login Instructions
 {DEVIN_QA_LOGIN_INSTRUCTIONS}
 
-{DOCLIST_TEST_SETUP}
+{DOCLIST_FIXTURE_SETUP}
 
 ---
 
@@ -457,17 +678,19 @@ Test filter and search functionality in the document list.
 - Clear search rapidly (type and clear multiple times)
 - Search with special regex characters (should escape)
         """,
+        fixture=DOCLIST_CASE_FIXTURE,
     ),
     create_qa_test(
         test_name="test-doclist-duplicates",
-        user_prompt=f"""
+        tags=["doclist"],
+        user_prompt=lambda: f"""
 ## Objective
 Test duplicate detection functionality in the document list.
 
 ## Login Instructions
 {DEVIN_QA_LOGIN_INSTRUCTIONS}
 
-{DOCLIST_TEST_SETUP}
+{DOCLIST_FIXTURE_SETUP}
 
 ---
 
@@ -493,17 +716,20 @@ Test duplicate detection functionality in the document list.
 - CHECK dismissed pairs don't reappear
 - Test re-running duplicate detection
         """,
+        fixture=DOCLIST_CASE_FIXTURE,
+        own_fixture=True,
     ),
     create_qa_test(
         test_name="test-doclist-expand-collapse",
-        user_prompt=f"""
+        tags=["doclist"],
+        user_prompt=lambda: f"""
 ## Objective
 Test expand and collapse functionality in the document list.
 
 ## Login Instructions
 {DEVIN_QA_LOGIN_INSTRUCTIONS}
 
-{DOCLIST_TEST_SETUP}
+{DOCLIST_FIXTURE_SETUP}
 
 ---
 
@@ -527,10 +753,13 @@ Test expand and collapse functionality in the document list.
   - Thumbnail quality
   - Page numbers display correctly
         """,
+        fixture=DOCLIST_CASE_FIXTURE,
+        own_fixture=True,
     ),
     create_qa_test(
         test_name="test-chat",
-        user_prompt=f"""
+        tags=["chat", "smoke"],
+        user_prompt=lambda: f"""
 ## Objective
 Test chat functionality including sending messages, receiving AI responses, term highlighting, clearing, copying, exporting, and case-based context.
 
@@ -605,10 +834,13 @@ Test chat functionality including sending messages, receiving AI responses, term
 - In an AI response that shows Sources: 1 2 3…, click on any source number
 {MODAL_DUAL_PANE_CHECKS}
         """,
+        # Creates its own cases, then switches between them
+        writes=[DEV_USER_CASES],
     ),
     create_qa_test(
         test_name="test-pdf-viewer",
-        user_prompt=f"""
+        tags=["pdf-viewer"],
+        user_prompt=lambda: f"""
 ## Objective
 Test PDF viewer functionality including page selection, zoom, OCR text view, rotation, deletion, and toolbar features.
 
@@ -687,10 +919,13 @@ Test PDF viewer functionality including page selection, zoom, OCR text view, rot
 - Click outside the page
 - CHECK toolbar hides when no page is actively selected
         """,
+        # Creates its own case
+        writes=[DEV_USER_CASES],
     ),
     create_qa_test(
         test_name="test-version-management",
-        user_prompt=f"""
+        tags=["versions"],
+        user_prompt=lambda: f"""
 ## Objective
 Test version management functionality including creating, renaming, deleting, and switching between versions.
 
@@ -748,5 +983,30 @@ Test version management functionality including creating, renaming, deleting, an
   - Viewer displays content of the selected version
   - No content leakage between versions
         """,
+        # Creates its own case
+        writes=[DEV_USER_CASES],
     ),
 ]
+
+
+def select_qa_tests(
+    patterns: list[str] | None = None,
+    tags: list[str] | None = None,
+    exclude_tags: list[str] | None = None,
+) -> list[QATest]:
+    """Select tests in catalog order.
+
+    A test is selected if its name matches any of the glob `patterns` (all
+    tests if none are given), it has at least one of `tags` (if given) and
+    none of `exclude_tags`.
+    """
+    return [
+        test
+        for test in QA_TESTS
+        if (
+            not patterns
+            or any(fnmatch.fnmatchcase(test["test_name"], p) for p in patterns)
+        )
+        and (not tags or set(tags) & set(test["tags"]))
+        and not set(exclude_tags or []) & set(test["tags"])
+    ]